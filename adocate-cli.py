@@ -1,21 +1,197 @@
 import argparse
-from core import process_photos
+import multiprocessing
+import sys
+from datetime import timedelta
+from core import PIPELINE_THREADS, parse_location_files, process_photos
+from export import EXPORT_FORMATS, export_locations
+from matching import INTERPOLATIONS
+from plan import apply_plan, make_plan, read_plan, write_plan
+from stats import RunStats
 
-def main():
-    parser = argparse.ArgumentParser(description="Add GPS data to photos using Google Maps location history.")
+def add_matching_arguments(parser):
+    """Add the options shared by the default command and plan."""
     parser.add_argument("photo_dir", help="Path to the directory containing photos.")
-    parser.add_argument("json_file", help="Path to the Google Maps location history JSON file.")
+    parser.add_argument("json_file", nargs="+", help="Path to the Google Maps location history JSON file (or other location files, a Takeout .zip, or .gz, .bz2 or .xz files).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used to tag photos (default: 1).")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-parse location files instead of using the parsed-location cache.")
+    parser.add_argument("--no-index", action="store_true", help="Re-read every photo instead of skipping files unchanged since the last run.")
+    parser.add_argument(
+        "--window",
+        type=float,
+        metavar="HOURS",
+        help="Only load location points within HOURS of the earliest and latest photo capture times.",
+    )
+    parser.add_argument("--sidecar", action="store_true", help="Write GPS data to XMP sidecar files instead of modifying the photos.")
+    parser.add_argument(
+        "--interpolate",
+        choices=INTERPOLATIONS,
+        help="Interpolate each photo's position between the surrounding track points instead of using the nearest one.",
+    )
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        metavar="MINUTES",
+        help="With --interpolate, leave photos untagged when the surrounding track points are more than MINUTES apart.",
+    )
+
+def print_errors(error_log):
+    if error_log:
+        print(f"{len(error_log)} photos could not be processed:")
+        for error in error_log:
+            print(error)
+
+def run_plan(argv):
+    parser = argparse.ArgumentParser(
+        prog="adocate-cli.py plan",
+        description="Match photos to locations and write the result to a plan file without modifying any photo.",
+    )
+    parser.add_argument("-o", "--output", required=True, help="Path of the plan file to write.")
+    add_matching_arguments(parser)
+    args = parser.parse_args(argv)
+
+    print("Planning...")
+    entries, skipped_count, error_log = make_plan(
+        args.photo_dir,
+        args.json_file,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        use_index=not args.no_index,
+        sidecar=args.sidecar,
+        interpolation=args.interpolate,
+        max_gap=timedelta(minutes=args.max_gap) if args.max_gap is not None else None,
+        window_tolerance=timedelta(hours=args.window) if args.window is not None else None,
+    )
+    write_plan(entries, args.output)
+
+    print(f"Planned GPS data for {len(entries)} photos in {args.output}.")
+    print(f"{skipped_count} photos already had GPS data.")
+    print_errors(error_log)
+
+def run_apply(argv):
+    parser = argparse.ArgumentParser(prog="adocate-cli.py apply", description="Write the locations of a plan file to the photos.")
+    parser.add_argument("plan_file", help="Path to a plan file written by the plan command.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used to write photos (default: 1).")
+    parser.add_argument("--no-index", action="store_true", help="Do not record the written photos in the photo index.")
+    parser.add_argument("--sidecar", action="store_true", help="Write GPS data to XMP sidecar files instead of modifying the photos.")
+    args = parser.parse_args(argv)
+
+    entries = read_plan(args.plan_file)
+    print(f"Applying {len(entries)} planned locations...")
+    added_count, changed, error_log = apply_plan(entries, jobs=args.jobs, sidecar=args.sidecar, use_index=not args.no_index)
+
+    print(f"GPS data added to {added_count} photos.")
+    if changed:
+        print(f"{len(changed)} photos changed since the plan was made and were left alone:")
+        for message in changed:
+            print(message)
+    print_errors(error_log)
+
+def run_export(argv):
+    parser = argparse.ArgumentParser(
+        prog="adocate-cli.py export",
+        description="Merge location files and write them as GPX, CSV or GeoJSON lines.",
+    )
+    parser.add_argument("-o", "--output", required=True, help="Path of the file to write; the format follows its extension unless --format is given.")
+    parser.add_argument("json_file", nargs="+", help="Path to the Google Maps location history JSON file (or other location files, a Takeout .zip, or .gz, .bz2 or .xz files).")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Output format (default: from the output file's extension, else gpx).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used to parse location files (default: 1).")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-parse location files instead of using the parsed-location cache.")
+    parser.add_argument(
+        "--segment-gap",
+        type=float,
+        metavar="MINUTES",
+        help="Start a new track segment where consecutive points are more than MINUTES apart.",
+    )
+    parser.add_argument("--by-month", action="store_true", help="Write each calendar month (UTC) to its own file.")
+    parser.add_argument("--max-size", type=float, metavar="MB", help="Continue in a new file once a file reaches MB megabytes.")
+    args = parser.parse_args(argv)
+
+    locations = parse_location_files(args.json_file, use_cache=not args.no_cache, jobs=args.jobs)
+    paths = export_locations(
+        locations,
+        args.output,
+        args.format,
+        segment_gap=timedelta(minutes=args.segment_gap) if args.segment_gap is not None else None,
+        by_month=args.by_month,
+        max_bytes=int(args.max_size * 1e6) if args.max_size is not None else None,
+    )
+    print(f"Exported {len(locations)} location points to:")
+    for path in paths:
+        print(path)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "plan":
+        return run_plan(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "apply":
+        return run_apply(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        return run_export(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(
+        description="Add GPS data to photos using Google Maps location history.",
+        epilog=(
+            "Use '%(prog)s plan -o PLAN ...' to only match photos, '%(prog)s apply PLAN' to write a plan, "
+            "and '%(prog)s export -o FILE ...' to export the merged locations."
+        ),
+    )
+    add_matching_arguments(parser)
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=PIPELINE_THREADS,
+        metavar="N",
+        help=f"With a single job, read and write photos with N threads each so disk and CPU work overlap; 0 disables this (default: {PIPELINE_THREADS}).",
+    )
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Search the top-level subfolders of photo_dir with N threads at once (default: 1).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run over the same folder, skipping the photos it already finished.",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="FILE",
+        help="Write per-stage timings, throughput and photo latency percentiles of the run to FILE as JSON.",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        metavar="FILE",
+        help="Write the same statistics to FILE in the Prometheus text format, for node_exporter's textfile collector.",
+    )
     args = parser.parse_args()
+    stats = RunStats() if args.stats or args.prometheus_textfile else None
 
     print("Processing photos...")
-    added_count, skipped_count, error_log = process_photos(args.photo_dir, args.json_file)
+    added_count, skipped_count, error_log = process_photos(
+        args.photo_dir,
+        args.json_file,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        use_index=not args.no_index,
+        sidecar=args.sidecar,
+        interpolation=args.interpolate,
+        max_gap=timedelta(minutes=args.max_gap) if args.max_gap is not None else None,
+        window_tolerance=timedelta(hours=args.window) if args.window is not None else None,
+        io_threads=args.io_threads,
+        scan_threads=args.scan_threads,
+        resume=args.resume,
+        stats=stats,
+    )
 
     print(f"GPS data added to {added_count} photos.")
     print(f"{skipped_count} photos already had GPS data.")
-    if error_log:
-        print(f"{len(error_log)} photos could not be processed:")
-        for error in error_log:
-            print(error)
+    print_errors(error_log)
+    if args.stats:
+        stats.write_json(args.stats)
+    if args.prometheus_textfile:
+        stats.write_prometheus(args.prometheus_textfile)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -1,7 +1,9 @@
 import os
 import sys
+import multiprocessing
 import customtkinter as ctk
-from core import process_photos, parse_location_files, export_to_gpx
+from core import process_photos, parse_location_files
+from export import export_locations
 import threading
 from tkinter import filedialog, messagebox
 
@@ -34,9 +36,16 @@ class App(ctk.CTk):
         self.location_file_paths = []
         self.unified_locations = []
         self.overwrite_gps = ctk.BooleanVar(value=False)
+        self.worker_count = ctk.StringVar(value="1")
+        self.write_sidecar = ctk.BooleanVar(value=False)
+        self.resume_run = ctk.BooleanVar(value=False)
+        self.cancel_event = threading.Event()
+        self.worker_thread = None
+        self.closing = False
 
         # UI setup
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def set_icon(self):
         """Set the application icon using a .ico file."""
@@ -86,18 +95,36 @@ class App(ctk.CTk):
         ctk.CTkButton(control_frame, text="Clear All", command=self.clear_all_files, width=150).pack(pady=5)
         ctk.CTkButton(control_frame, text="Export GPX", command=self.export_gpx, width=150).pack(pady=(5, 0))
 
-        # Overwrite Option
-        ctk.CTkCheckBox(main_frame, text="Overwrite existing GPS data", variable=self.overwrite_gps).pack(pady=10)
+        # Options
+        options_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        options_frame.pack(pady=10)
+        ctk.CTkCheckBox(options_frame, text="Overwrite existing GPS data", variable=self.overwrite_gps).pack(side="left", padx=10)
+        ctk.CTkCheckBox(options_frame, text="Write XMP sidecars", variable=self.write_sidecar).pack(side="left", padx=10)
+        ctk.CTkCheckBox(options_frame, text="Resume interrupted run", variable=self.resume_run).pack(side="left", padx=10)
+        ctk.CTkLabel(options_frame, text="Workers:", font=ctk.CTkFont(size=14)).pack(side="left", padx=(20, 5))
+        ctk.CTkOptionMenu(
+            options_frame,
+            variable=self.worker_count,
+            values=[str(n) for n in range(1, (os.cpu_count() or 1) + 1)],
+            width=80,
+        ).pack(side="left")
 
         # Progress Bar
         self.progress_bar = ctk.CTkProgressBar(main_frame, orientation="horizontal", mode="determinate", width=500)
-        self.progress_bar.pack(pady=20)
+        self.progress_bar.pack(pady=(20, 5))
         self.progress_bar.set(0.0)  # Ensure the progress bar starts empty
+        self.progress_label = ctk.CTkLabel(main_frame, text="", font=ctk.CTkFont(size=12))
+        self.progress_label.pack(pady=(0, 10))
 
-        # Run Button
-        self.run_button = ctk.CTkButton(main_frame, text="Run", command=self.run_in_thread, width=200, height=40,
+        # Run and Cancel Buttons
+        button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        button_frame.pack(pady=20)
+        self.run_button = ctk.CTkButton(button_frame, text="Run", command=self.run_in_thread, width=200, height=40,
                                         font=ctk.CTkFont(size=16, weight="bold"))
-        self.run_button.pack(pady=20)
+        self.run_button.pack(side="left", padx=10)
+        self.cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=self.cancel_event.set, width=120, height=40,
+                                           state="disabled")
+        self.cancel_button.pack(side="left", padx=10)
 
     def select_folder(self):
         folder = filedialog.askdirectory(title="Select a Photo Folder")
@@ -127,14 +154,39 @@ class App(ctk.CTk):
         self.location_file_paths.clear()
         self.update_file_list()
 
-    def update_progress(self, current, total):
-        progress_value = current / total if total > 0 else 0
-        self.progress_bar.set(progress_value)
+    def update_progress(self, processed, discovered, total):
+        # Photos are still being found until total is known, so only the counts can be shown
+        if total is None:
+            if self.progress_bar.cget("mode") != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start()
+            self.progress_label.configure(text=f"{processed} / {discovered} photos (still searching)")
+        else:
+            if self.progress_bar.cget("mode") != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(processed / total if total > 0 else 0)
+            self.progress_label.configure(text=f"{processed} / {total} photos")
         self.update_idletasks()
 
+    def reset_progress(self):
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0.0)
+        self.progress_label.configure(text="")
+
     def run_in_thread(self):
-        thread = threading.Thread(target=self.run_process, daemon=True)
-        thread.start()
+        self.worker_thread = threading.Thread(target=self.run_process, daemon=True)
+        self.worker_thread.start()
+
+    def on_close(self):
+        """Stop a running job so its progress is journaled, then close the window."""
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            self.closing = True
+            self.cancel_event.set()
+            self.after(100, self.on_close)
+            return
+        self.destroy()
 
     def run_process(self):
         folder = self.folder_path.get()
@@ -144,14 +196,25 @@ class App(ctk.CTk):
 
         try:
             self.run_button.configure(state="disabled")
-            self.progress_bar.set(0.0)
+            self.cancel_button.configure(state="normal")
+            self.cancel_event.clear()
+            self.reset_progress()
 
-            self.unified_locations = parse_location_files(self.location_file_paths)
             added_count, skipped_count, error_log = process_photos(
-                folder, self.location_file_paths, progress_callback=self.update_progress, overwrite=self.overwrite_gps.get()
+                folder,
+                self.location_file_paths,
+                progress_callback=self.update_progress,
+                overwrite=self.overwrite_gps.get(),
+                jobs=int(self.worker_count.get()),
+                sidecar=self.write_sidecar.get(),
+                cancel=self.cancel_event,
+                resume=self.resume_run.get(),
             )
+            if self.closing:
+                return
 
-            result_message = (
+            result_message = "Run cancelled.\n" if self.cancel_event.is_set() else ""
+            result_message += (
                 f"GPS data added to {added_count} photos.\n"
                 f"{skipped_count} photos were skipped.\n"
             )
@@ -164,7 +227,11 @@ class App(ctk.CTk):
             messagebox.showerror("Error", f"An error occurred: {e}")
 
         finally:
+            if self.progress_bar.cget("mode") == "indeterminate":
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode="determinate")
             self.run_button.configure(state="normal")
+            self.cancel_button.configure(state="disabled")
 
     def export_gpx(self):
         if not self.location_file_paths:
@@ -172,17 +239,20 @@ class App(ctk.CTk):
             return
 
         try:
-            self.unified_locations = parse_location_files(self.location_file_paths)
+            self.unified_locations = parse_location_files(self.location_file_paths, jobs=int(self.worker_count.get()))
             output_file = filedialog.asksaveasfilename(
-                defaultextension=".gpx", filetypes=[("GPX Files", "*.gpx")], title="Save GPX File"
+                defaultextension=".gpx",
+                filetypes=[("GPX Files", "*.gpx"), ("CSV Files", "*.csv"), ("GeoJSON Lines Files", "*.geojsonl")],
+                title="Save GPX File",
             )
             if output_file:
-                export_to_gpx(self.unified_locations, output_file)
-                messagebox.showinfo("Success", f"GPX file saved to {output_file}.")
+                export_locations(self.unified_locations, output_file)
+                messagebox.showinfo("Success", f"Locations saved to {output_file}.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export GPX: {e}")
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
@@ -0,0 +1,131 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+# Separates a zip archive's path from a member's name in the path of a zip member
+MEMBER_SEPARATOR = "::"
+
+# Leading bytes of each compressed format; zip archives are recognised separately
+COMPRESSED_MAGIC = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+ZIP_MAGIC = b"PK\x03\x04"
+
+# Location history files in a Takeout archive: Records.json, the monthly
+# Semantic Location History files and the newer on-device Timeline exports
+LOCATION_MEMBER = re.compile(
+    r"(?:^|/)(?:Records|Timeline|location-history|\d{4}_[A-Z]+)\.json$|\.nmea$", re.IGNORECASE
+)
+# Members considered when an archive has none named like the above
+CANDIDATE_MEMBER = re.compile(r"\.(?:json|nmea)$", re.IGNORECASE)
+
+# The zip archive opened last, kept open while its members are read one after another
+_open_zip: Dict[str, Any] = {}
+
+
+def member_path(archive: str, member: str) -> str:
+    """Return the path naming member of zip archive."""
+    return f"{archive}{MEMBER_SEPARATOR}{member}"
+
+
+def split_member(path: str) -> Tuple[str, Optional[str]]:
+    """Return (archive, member) for the path of a zip member, or (path, None) for any other file."""
+    start = path.find(MEMBER_SEPARATOR)
+    while start >= 0 and not os.path.isfile(path):
+        if os.path.isfile(path[:start]):
+            return path[:start], path[start + len(MEMBER_SEPARATOR):]
+        start = path.find(MEMBER_SEPARATOR, start + 1)
+    return path, None
+
+
+def _magic(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(8)
+
+
+def is_zip(path: str) -> bool:
+    """Return whether path is a zip archive, judging by its content."""
+    try:
+        return _magic(path).startswith(ZIP_MAGIC) and zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+
+def is_compressed(path: str) -> bool:
+    """Return whether path is a zip member or a gzip, bzip2 or xz file, which cannot be memory-mapped."""
+    archive, member = split_member(path)
+    if member is not None:
+        return True
+    magic = _magic(path)
+    return any(magic.startswith(prefix) for prefix, _ in COMPRESSED_MAGIC)
+
+
+def _zip(archive: str) -> zipfile.ZipFile:
+    """Return an open ZipFile for archive, reusing the last one while the archive is unchanged.
+
+    Reading a large archive's central directory takes a while, so the members
+    of one archive share it. A forked worker process opens its own, since the
+    file position of an inherited one is shared with the parent.
+    """
+    stat = os.stat(archive)
+    key = (os.path.abspath(archive), stat.st_size, stat.st_mtime_ns, os.getpid())
+    if _open_zip.get("key") != key:
+        close_archives()
+        _open_zip.update(key=key, zip=zipfile.ZipFile(archive))
+    return _open_zip["zip"]
+
+
+def close_archives():
+    """Close the zip archive kept open by the last member read, if any."""
+    if _open_zip:
+        _open_zip.pop("zip").close()
+        _open_zip.clear()
+
+
+@contextmanager
+def open_binary(path: str) -> Iterator[BinaryIO]:
+    """Open a plain file, a gzip, bzip2 or xz file or a zip member for reading its decompressed bytes.
+
+    Compressed data is decompressed as it is read, never extracted to disk.
+    """
+    archive, member = split_member(path)
+    if member is not None:
+        with _zip(archive).open(member) as f:
+            yield f
+        return
+    magic = _magic(path)
+    opener = next((opener for prefix, opener in COMPRESSED_MAGIC if magic.startswith(prefix)), open)
+    with opener(path, "rb") as f:
+        yield f
+
+
+@contextmanager
+def open_text(path: str) -> Iterator[TextIO]:
+    """Open path like open_binary, decoding UTF-8 text."""
+    if not is_compressed(path):
+        with open(path, "r", encoding="utf-8") as f:
+            yield f
+        return
+    with open_binary(path) as f, io.TextIOWrapper(f, encoding="utf-8") as text:
+        yield text
+
+
+def zip_members(archive: str) -> List[str]:
+    """Return the paths of the members of archive that may hold location history.
+
+    These are the members named like Takeout's location history files or,
+    if there are none, every JSON and NMEA member.
+    """
+    names = [info.filename for info in _zip(archive).infolist() if not info.is_dir()]
+    members = [name for name in names if LOCATION_MEMBER.search(name)]
+    if not members:
+        members = [name for name in names if CANDIDATE_MEMBER.search(name)]
+    return [member_path(archive, name) for name in members]
@@ -0,0 +1,94 @@
+"""Compare the memory-mapped NMEA scanner with the original line-by-line parser.
+
+Usage: python bench_nmea.py [NMEA_FILE] [--fixes N]
+
+Without NMEA_FILE, a synthetic multi-day log of N one-second fixes is
+generated in a temporary directory.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from functools import reduce
+from operator import xor
+
+from parsers import NMEALocationParser
+from track import LocationTrack
+
+
+def _sentence(body: str) -> str:
+    return f"${body}*{reduce(xor, body.encode('ascii'), 0):02X}\r\n"
+
+
+def _nmea_coordinate(value: float, width: int) -> str:
+    degrees = int(abs(value))
+    return f"{degrees:0{width}d}{(abs(value) - degrees) * 60:07.4f}"
+
+
+def generate_nmea(path: str, fixes: int, start: datetime = datetime(2023, 6, 1, 22, tzinfo=timezone.utc), talker: str = "GP"):
+    """Write a log of one GGA, RMC and GSV sentence per second, starting at start."""
+    with open(path, "w", encoding="ascii", newline="") as f:
+        for i in range(fixes):
+            t = start + timedelta(seconds=i)
+            lat, lng = 35.6 + i * 1e-5, 139.7 - i * 1e-5
+            hms, dmy = t.strftime("%H%M%S.00"), t.strftime("%d%m%y")
+            la, lo = _nmea_coordinate(lat, 2), _nmea_coordinate(lng, 3)
+            f.write(_sentence(f"{talker}GGA,{hms},{la},N,{lo},E,1,08,0.9,40.0,M,39.0,M,,"))
+            f.write(_sentence(f"{talker}RMC,{hms},A,{la},N,{lo},E,0.5,90.0,{dmy},,,A"))
+            f.write(_sentence("GPGSV,3,1,11,10,63,137,17,07,61,098,15,05,59,290,20,08,54,157,30"))
+
+
+def _legacy_coordinate(coord: str, direction: str) -> float:
+    if not coord or not direction:
+        raise ValueError("Invalid NMEA coordinate or direction.")
+    degrees = int(float(coord) / 100)
+    decimal = degrees + (float(coord) - degrees * 100) / 60
+    return -decimal if direction in ("S", "W") else decimal
+
+
+def _legacy_timestamp(time_str: str) -> datetime:
+    if not time_str:
+        raise ValueError("Invalid NMEA time string.")
+    second = int(float(time_str[4:]))
+    return datetime.utcnow().replace(hour=int(time_str[:2]), minute=int(time_str[2:4]), second=second, microsecond=0)
+
+
+def _legacy_parse(path: str) -> LocationTrack:
+    """The original decoder: every $GPGGA line, split and dated with the current day."""
+    track = LocationTrack()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("$GPGGA"):
+                continue
+            try:
+                parts = line.split(",")
+                latitude, longitude = _legacy_coordinate(parts[2], parts[3]), _legacy_coordinate(parts[4], parts[5])
+                track.add(latitude, longitude, _legacy_timestamp(parts[1]))
+            except Exception as e:
+                print(f"Error parsing NMEA line: {line.strip()} - {e}")
+    return track
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("nmea_file", nargs="?", help="NMEA log to parse (default: a generated one).")
+    parser.add_argument("--fixes", type=int, default=500_000, help="Fixes in the generated log (default: 500000).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = args.nmea_file
+        if path is None:
+            path = os.path.join(temp_dir, "bench.nmea")
+            generate_nmea(path, args.fixes)
+        size_mb = os.path.getsize(path) / 1e6
+
+        for name, parse in (("line parser", _legacy_parse), ("mmap scanner", NMEALocationParser.parse)):
+            started = time.perf_counter()
+            track = parse(path)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>12}: {len(track)} fixes in {elapsed:.2f}s ({size_mb / elapsed:.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Benchmark the parsers, matching, process_photos and export_to_gpx on synthetic data.
+
+Usage: python benchmark.py [-o RESULTS] [--compare BASELINE] [--points N] [--photos N]
+
+Every run generates the same Records.json, Semantic Location History,
+Timeline and NMEA files and a tree of small JPEGs for the given sizes, times
+each benchmark (best of --repeat runs) and measures its peak Python memory
+in a separate run under tracemalloc. Results are written as JSON; with
+--compare, benchmarks that got slower or bigger than the baseline by more
+than --threshold percent are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import piexif
+
+from bench_nmea import generate_nmea
+
+START = datetime(2023, 6, 1, 22, tzinfo=timezone.utc)
+SEED = 2023
+
+# An 8x8 grey baseline JPEG without metadata, to which each photo's EXIF block is added
+TINY_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123251d"
+    "283a333d3c3933383740485c4e404457453738506d51575f626768673e4d71797064785c656763ffc0000b080008000801011100"
+    "ffc4001f0000010501010101010100000000000000000102030405060708090a0bffc400b5100002010303020403050504040000"
+    "017d01020300041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a2526272829"
+    "2a3435363738393a434445464748494a535455565758595a636465666768696a737475767778797a838485868788898a9293949596"
+    "9798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3"
+    "f4f5f6f7f8f9faffda0008010100003f002bffd9"
+)
+
+
+def _walk(points: int, interval: timedelta, start: datetime = START):
+    """Yield (time, latitude, longitude) of a reproducible random walk around Tokyo."""
+    rng = random.Random(SEED)
+    lat, lng = 35.68, 139.76
+    for i in range(points):
+        lat += rng.uniform(-1e-4, 1e-4)
+        lng += rng.uniform(-1e-4, 1e-4)
+        yield start + i * interval, lat, lng
+
+
+def _iso(t: datetime) -> str:
+    return t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t.microsecond // 1000:03d}Z"
+
+
+def generate_records(path: str, points: int, interval: timedelta = timedelta(seconds=10)):
+    """Write a Records.json export with points entries."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"locations": [')
+        for i, (t, lat, lng) in enumerate(_walk(points, interval)):
+            entry = {
+                "latitudeE7": round(lat * 1e7), "longitudeE7": round(lng * 1e7), "accuracy": 20,
+                "source": "WIFI", "timestampMs": str(int(t.timestamp() * 1000)), "timestamp": _iso(t),
+            }
+            f.write(("," if i else "") + "\n    " + json.dumps(entry))
+        f.write("\n]}\n")
+
+
+def generate_semantic(path: str, objects: int, interval: timedelta = timedelta(minutes=30)):
+    """Write a Semantic Location History file of alternating activity segments and place visits."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"timelineObjects": [')
+        previous = None
+        for i, (t, lat, lng) in enumerate(_walk(objects + 1, interval)):
+            point = {"latitudeE7": round(lat * 1e7), "longitudeE7": round(lng * 1e7)}
+            if previous is not None:
+                duration = {"startTimestamp": _iso(previous[0]), "endTimestamp": _iso(t)}
+                if i % 2:
+                    obj = {"activitySegment": {
+                        "startLocation": previous[1], "endLocation": point, "duration": duration,
+                        "distance": 1200, "activityType": "WALKING", "confidence": "HIGH",
+                    }}
+                else:
+                    obj = {"placeVisit": {
+                        "location": dict(previous[1], placeId="ChIJ-synthetic", address="Tokyo, Japan"),
+                        "duration": duration, "placeConfidence": "HIGH_CONFIDENCE",
+                    }}
+                f.write(("," if i > 1 else "") + "\n    " + json.dumps(obj))
+            previous = (t, point)
+        f.write("\n]}\n")
+
+
+def generate_timeline(path: str, points: int, per_segment: int = 60, interval: timedelta = timedelta(seconds=10)):
+    """Write an on-device Timeline export whose semanticSegments carry timelinePath points."""
+    local = timezone(timedelta(hours=9))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"semanticSegments": [')
+        walk = list(_walk(points, interval))
+        for i in range(0, len(walk), per_segment):
+            chunk = walk[i:i + per_segment]
+            segment = {
+                "startTime": chunk[0][0].astimezone(local).isoformat(timespec="milliseconds"),
+                "endTime": chunk[-1][0].astimezone(local).isoformat(timespec="milliseconds"),
+                "timelinePath": [
+                    {"point": f"{lat:.7f}°, {lng:.7f}°", "time": t.astimezone(local).isoformat(timespec="milliseconds")}
+                    for t, lat, lng in chunk
+                ],
+            }
+            f.write(("," if i else "") + "\n    " + json.dumps(segment, ensure_ascii=False))
+        f.write("\n]}\n")
+
+
+def generate_photos(directory: str, count: int, span: timedelta, per_folder: int = 100):
+    """Write count small JPEGs with DateTimeOriginal spread over span, in folders of per_folder."""
+    rng = random.Random(SEED)
+    for i in range(count):
+        folder = os.path.join(directory, f"{i // per_folder:03d}")
+        os.makedirs(folder, exist_ok=True)
+        taken = START + timedelta(seconds=rng.uniform(0, span.total_seconds()))
+        exif = piexif.dump({"Exif": {piexif.ExifIFD.DateTimeOriginal: taken.strftime("%Y:%m:%d %H:%M:%S")}})
+        piexif.insert(exif, TINY_JPEG, os.path.join(folder, f"IMG_{i:05d}.jpg"))
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None  # Runs before each timed run, untimed
+
+
+def make_benchmarks(data_dir: str, points: int, photos: int) -> List[Benchmark]:
+    """Generate the input files in data_dir and return the benchmarks over them."""
+    import core
+    import parsers
+    from matching import make_index
+
+    files = {
+        "records": os.path.join(data_dir, "Records.json"),
+        "semantic": os.path.join(data_dir, "Semantic.json"),
+        "timeline": os.path.join(data_dir, "Timeline.json"),
+        "nmea": os.path.join(data_dir, "log.nmea"),
+    }
+    generate_records(files["records"], points)
+    generate_semantic(files["semantic"], max(1, points // 10))
+    generate_timeline(files["timeline"], points)
+    generate_nmea(files["nmea"], points, start=START)
+    span = timedelta(seconds=10) * points
+    photo_source = os.path.join(data_dir, "photos")
+    generate_photos(photo_source, photos, span)
+
+    track = parsers.parse_location_files(list(files.values()))
+    rng = random.Random(SEED)
+    photo_times = [START + timedelta(seconds=rng.uniform(0, span.total_seconds())) for _ in range(100_000)]
+    photo_dir = os.path.join(data_dir, "work")
+    journal_path = os.path.join(data_dir, "run.journal")
+
+    def fresh_photos():
+        shutil.rmtree(photo_dir, ignore_errors=True)
+        shutil.copytree(photo_source, photo_dir)
+
+    def tag(**options):
+        return core.process_photos(photo_dir, list(files.values()), use_cache=False, use_index=False,
+                                   journal_path=journal_path, **options)
+
+    return [
+        Benchmark("parse_records", lambda: parsers.JSONLocationParser.parse(files["records"])),
+        Benchmark("parse_semantic", lambda: parsers.GoogleTimelineParser.parse(files["semantic"])),
+        Benchmark("parse_timeline", lambda: parsers.OldJSONLocationParser.parse(files["timeline"])),
+        Benchmark("parse_nmea", lambda: parsers.NMEALocationParser.parse(files["nmea"])),
+        Benchmark("parse_location_files", lambda: parsers.parse_location_files(list(files.values()))),
+        Benchmark("match_nearest", lambda: make_index(track).match_many(photo_times)),
+        Benchmark("match_linear", lambda: make_index(track, "linear").match_many(photo_times)),
+        Benchmark("process_photos", lambda: tag(), fresh_photos),
+        Benchmark("process_photos_serial", lambda: tag(io_threads=0), fresh_photos),
+        Benchmark("export_to_gpx", lambda: core.export_to_gpx(track, os.path.join(data_dir, "export.gpx"))),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int) -> Dict:
+    """Time benchmark repeat times, then measure its peak traced memory in one more run."""
+    runs = []
+    for _ in range(repeat):
+        if benchmark.setup:
+            benchmark.setup()
+        started = time.perf_counter()
+        benchmark.run()
+        runs.append(time.perf_counter() - started)
+
+    if benchmark.setup:
+        benchmark.setup()
+    tracemalloc.start()
+    try:
+        benchmark.run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(runs), "runs": runs, "peak_bytes": peak}
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return a message for each benchmark more than threshold percent slower or bigger than in baseline."""
+    if results["scale"] != baseline.get("scale"):
+        print(f"Warning: baseline was run at scale {baseline.get('scale')}, not {results['scale']}.")
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            continue
+        for key, unit in (("seconds", "s"), ("peak_bytes", " bytes")):
+            if previous[key] and current[key] > previous[key] * (1 + threshold / 100):
+                change = (current[key] / previous[key] - 1) * 100
+                regressions.append(f"{name}: {key} {previous[key]:.6g}{unit} -> {current[key]:.6g}{unit} (+{change:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Where to write the results (default: benchmark.json).")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results file of an earlier run to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=10.0, metavar="PERCENT",
+                        help="Slowdown or memory growth that counts as a regression (default: 10).")
+    parser.add_argument("--points", type=int, default=100_000, help="Location points per generated file (default: 100000).")
+    parser.add_argument("--photos", type=int, default=500, help="Photos in the generated tree (default: 500).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best is kept (default: 3).")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Run only these benchmarks.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Keep the location cache, photo index and journals of the benchmark runs out of the user's cache
+        os.environ["ADOCATE_CACHE_DIR"] = os.path.join(data_dir, "cache")
+        print(f"Generating {args.points} location points per file and {args.photos} photos...")
+        benchmarks = make_benchmarks(data_dir, args.points, args.photos)
+        if args.only:
+            benchmarks = [benchmark for benchmark in benchmarks if benchmark.name in args.only]
+
+        results = {
+            "scale": {"points": args.points, "photos": args.photos},
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "benchmarks": {},
+        }
+        for benchmark in benchmarks:
+            # Benchmarked code prints progress; keep the report readable
+            with open(os.devnull, "w") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    result = measure(benchmark, args.repeat)
+                finally:
+                    sys.stdout = stdout
+            results["benchmarks"][benchmark.name] = result
+            print(f"{benchmark.name:>22}: {result['seconds']:8.3f}s  peak {result['peak_bytes'] / 1e6:8.1f} MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {args.output}.")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.compare}:")
+            for message in regressions:
+                print(message)
+            sys.exit(1)
+        print(f"No regressions against {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from typing import Optional
+
+import archives
+from track import LocationTrack
+
+MAGIC = b"ADOTRK03"  # Bumped whenever parser output changes, which invalidates old entries
+# magic, point count, source size, source mtime_ns, content digest; padded so the int64 column is aligned
+HEADER = struct.Struct("<8sQQQ16s")
+HEADER_SIZE = 64
+SAMPLE_SIZE = 1 << 20
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def default_cache_dir() -> str:
+    """Return the per-user cache directory, honouring ADOCATE_CACHE_DIR."""
+    if os.environ.get("ADOCATE_CACHE_DIR"):
+        return os.environ["ADOCATE_CACHE_DIR"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "adocate")
+
+
+def content_digest(file_path: str, size: int) -> bytes:
+    """Hash the first and last megabyte of a file.
+
+    Together with size and mtime this catches files replaced in place without
+    reading a multi-gigabyte export end to end.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.digest()
+
+
+class LocationCache:
+    """On-disk cache of parsed, time-sorted tracks, one file per source file.
+
+    Entries are looked up by absolute path and validated against the source's
+    size, mtime and content digest, so edited or replaced files are re-parsed
+    automatically; zip members are validated against their archive. Cached
+    arrays are memory-mapped on load. The directory is kept under max_bytes
+    by evicting the least recently used entries.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, file_path: str) -> str:
+        archive, member = archives.split_member(file_path)
+        source = os.path.abspath(archive)
+        if member is not None:
+            source = archives.member_path(source, member)
+        key = hashlib.sha1(source.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.trk")
+
+    def load(self, file_path: str) -> Optional[LocationTrack]:
+        """Return the cached track for file_path, or None if missing or stale."""
+        entry_path = self._entry_path(file_path)
+        source_path = archives.split_member(file_path)[0]
+        try:
+            stat = os.stat(source_path)
+            with open(entry_path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+                magic, count, size, mtime_ns, digest = HEADER.unpack_from(header)
+                if magic != MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                    return None
+                if digest != content_digest(source_path, size):
+                    return None
+                if count == 0:
+                    track = LocationTrack()
+                else:
+                    mapped = mmap.mmap(f.fileno(), HEADER_SIZE + count * 16, access=mmap.ACCESS_READ)
+                    track = LocationTrack.from_buffer(mapped, count, HEADER_SIZE)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(entry_path)
+            return track
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def store(self, file_path: str, track: LocationTrack):
+        """Write a sorted track for file_path, then evict old entries if over budget."""
+        source_path = archives.split_member(file_path)[0]
+        stat = os.stat(source_path)
+        header = HEADER.pack(MAGIC, len(track), stat.st_size, stat.st_mtime_ns, content_digest(source_path, stat.st_size))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(file_path)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(memoryview(track.timestamps).cast("B"))
+            f.write(memoryview(track.latitudes).cast("B"))
+            f.write(memoryview(track.longitudes).cast("B"))
+        os.replace(temp_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(".trk")]
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                # Entries still mapped by this process cannot be removed on Windows
+                print(f"Could not evict cache entry {path}: {e}")
+
+    def clear(self):
+        """Remove every cache entry."""
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
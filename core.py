@@ -1,20 +1,116 @@
 import os
+import queue
+import threading
 import piexif
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from parsers import LocationParserFactory
+from itertools import islice
+import parsers
+from cache import LocationCache
+from export import export_locations
+from jpegmeta import ExifSummary, probe_jpeg, read_exif_segment, write_exif
+from journal import RunJournal, default_journal_path
+from matching import make_index
+from photoindex import PhotoIndex, PhotoRecord
+from stats import RunStats
+from track import LocationTrack
+from xmp import read_sidecar_gps, sidecar_path, write_sidecar_gps
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg")
+
+# Outcomes of process_photo
+ADDED, SKIPPED, ERROR = "added", "skipped", "error"
+
+# Number of photo records written to the PhotoIndex per transaction
+INDEX_BATCH_SIZE = 500
+
+# Reader and writer threads of the single-process pipeline, and the capacity of the queues between its stages
+PIPELINE_THREADS = 4
+PIPELINE_QUEUE_SIZE = 64
+
+# Photos handed to a worker process at a time
+PARALLEL_CHUNK_SIZE = 16
+
+# Bytes of EXIF blocks prescan_photos keeps for the tagging pass, so that it need not read them again
+PRESCAN_EXIF_BUDGET = 64 << 20
+
+def _scan_tree(directory):
+    """Yield the photo files under directory, top-down like os.walk, using os.scandir."""
+    stack = [directory]
+    while stack:
+        path = stack.pop()
+        photos, subdirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    # DirEntry answers both checks from the directory listing on most platforms
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(PHOTO_EXTENSIONS) and entry.is_file():
+                        photos.append(entry.path)
+        except OSError as e:
+            print(f"Cannot access directory: {path}: {e}")
+        yield from photos
+        stack.extend(reversed(subdirs))
+
+def iter_photos(directory, threads=1):
+    """Yield photo files under directory as they are found.
+
+    With threads > 1, the top-level subdirectories are walked concurrently by
+    that many threads and photos come in no particular order.
+    """
+    if threads <= 1:
+        yield from _scan_tree(directory)
+        return
+
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(PHOTO_EXTENSIONS) and entry.is_file():
+                    yield entry.path
+    except OSError as e:
+        print(f"Cannot access directory: {directory}: {e}")
+        return
+
+    found = queue.Queue(PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+
+    def walk(subdir):
+        try:
+            for photo_path in _scan_tree(subdir):
+                if not _put(found, photo_path, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        _put(found, _DONE, stop)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for subdir in subdirs:
+            pool.submit(walk, subdir)
+        try:
+            remaining = len(subdirs)
+            while remaining:
+                photo_path = _get(found, stop)
+                if photo_path is _DONE:
+                    if stop.is_set():
+                        break
+                    remaining -= 1
+                else:
+                    yield photo_path
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
 
 def find_photos_recursively(directory):
     """Recursively find all photo files in a directory."""
-    photo_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg')):
-                full_path = os.path.join(root, file)
-                if os.access(full_path, os.R_OK):
-                    photo_files.append(full_path)
-                else:
-                    print(f"Cannot access file: {full_path}")
-    return photo_files
+    return list(iter_photos(directory))
 
 def get_photo_timestamp(photo_path):
     """Get timestamp from photo's EXIF data."""
@@ -31,8 +127,13 @@ def get_photo_timestamp(photo_path):
         print(f"Error reading timestamp from {photo_path}: {e}")
     return None
 
-def has_gps_data(photo_path):
-    """Check if the photo already contains valid GPS data."""
+def has_gps_data(photo_path, use_sidecar=False):
+    """Check if the photo already contains valid GPS data.
+
+    With use_sidecar, GPS coordinates in the photo's XMP sidecar count too.
+    """
+    if use_sidecar and read_sidecar_gps(photo_path):
+        return True
     try:
         exif_dict = piexif.load(photo_path)
         gps_data = exif_dict.get("GPS", {})
@@ -42,6 +143,24 @@ def has_gps_data(photo_path):
         print(f"Error checking GPS data for {photo_path}: {e}")
     return False
 
+def probe_photo(photo_path):
+    """Read DateTimeOriginal, its subsecond/offset fields and GPS presence in one header pass."""
+    try:
+        return probe_jpeg(photo_path)
+    except Exception as e:
+        print(f"Error reading EXIF data from {photo_path}: {e}")
+    return ExifSummary()
+
+def exif_timestamp(summary):
+    """Convert a probed DateTimeOriginal to a datetime, read as UTC like get_photo_timestamp."""
+    if not summary.datetime_original:
+        return None
+    try:
+        return datetime.strptime(summary.datetime_original, "%Y:%m:%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except ValueError as e:
+        print(f"Invalid DateTimeOriginal {summary.datetime_original!r}: {e}")
+    return None
+
 def create_gps_ifd(lat, lng):
     """Create GPS IFD (Image File Directory)."""
     def convert_to_dms(degree):
@@ -61,32 +180,80 @@ def create_gps_ifd(lat, lng):
     }
     return gps_ifd
 
-def add_gps_to_photo(photo_path, lat, lng):
-    """Add GPS information to a photo."""
+def add_gps_to_photo(photo_path, lat, lng, exif=None):
+    """Add GPS information to a photo.
+
+    exif may carry the APP1 payload already read by probe_photo, which saves
+    reading the file's EXIF block a second time; otherwise only the header
+    segments in front of it are read.
+    """
     try:
         gps_ifd = create_gps_ifd(lat, lng)
-        exif_dict = piexif.load(photo_path)
+        if exif is None:
+            with open(photo_path, "rb") as f:
+                exif = read_exif_segment(f)
+        # What piexif.load returns for a JPEG without EXIF
+        exif_dict = piexif.load(exif) if exif is not None else {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
         exif_dict["GPS"] = gps_ifd
         exif_bytes = piexif.dump(exif_dict)
-        piexif.insert(exif_bytes, photo_path)
+        write_exif(photo_path, exif_bytes)
+        return True
     except Exception as e:
         print(f"Failed to add GPS data to {photo_path}: {e}")
+    return False
+
+def parse_location_files(location_files, use_cache=True, window=None, jobs=1):
+    """Parse multiple location files and return a unified, time-sorted LocationTrack.
 
-def parse_location_files(location_files):
-    """Parse multiple location files and return a unified list of GPX-style data."""
-    all_locations = []
-    for file_path in location_files:
+    Parsed tracks are kept in the on-disk LocationCache unless use_cache is False.
+    window is an optional (start, end) datetime pair limiting the points loaded.
+    With jobs > 1, several files are parsed at once in worker processes.
+    """
+    return parsers.parse_location_files(
+        location_files, cache=LocationCache() if use_cache else None, window=window, jobs=jobs
+    )
+
+def prescan_photos(tasks, overwrite=False, tolerance=timedelta(0), sidecar=False, stats=None, exif_budget=PRESCAN_EXIF_BUDGET):
+    """Probe every photo up front and return (tasks, window).
+
+    tasks are (photo_path, known, exif) triples. The returned ones carry a
+    current PhotoRecord for each photo, so the tagging pass does not probe
+    them again, and the EXIF block probed from photos that still need a
+    location, up to exif_budget bytes in all, so that it is not read again
+    for the write. window is the (start, end) range of capture times of the
+    photos that still need a location, widened by tolerance, or None if no
+    photo does. The header bytes probed are counted in stats, if given.
+    """
+    scanned, photo_times = [], []
+    for photo_path, known, exif in tasks:
         try:
-            parser = LocationParserFactory.get_parser(file_path)
-            all_locations.extend(parser.parse(file_path))
-        except Exception as e:
-            print(f"Error parsing file {file_path}: {e}")
-    # Sort locations by timestamp
-    all_locations.sort(key=lambda loc: loc["timestamp"])
-    return all_locations
+            stat = os.stat(photo_path)
+            metadata = None
+            if known is None or not known.matches(stat):
+                metadata = probe_photo(photo_path)
+                if stats and metadata.exif:
+                    stats.count("bytes_read", len(metadata.exif))
+                known = PhotoRecord(photo_path, stat.st_size, stat.st_mtime_ns, metadata.datetime_original, metadata.has_gps)
+            if overwrite or not (known.has_gps or (sidecar and read_sidecar_gps(photo_path))):
+                photo_time = exif_timestamp(known)
+                if photo_time:
+                    photo_times.append(photo_time)
+                if metadata is not None and metadata.exif and len(metadata.exif) <= exif_budget:
+                    exif = metadata.exif
+                    exif_budget -= len(exif)
+        except OSError as e:
+            print(f"Error reading {photo_path}: {e}")
+        scanned.append((photo_path, known, exif))
+
+    if not photo_times:
+        return scanned, None
+    return scanned, (min(photo_times) - tolerance, max(photo_times) + tolerance)
 
 def find_closest_location(photo_time, locations):
-    """Find the closest location by timestamp."""
+    """Find the closest location by timestamp.
+
+    Linear reference implementation; process_photos uses matching.LocationIndex.
+    """
     closest_location = None
     min_diff = timedelta.max
     for loc in locations:
@@ -96,71 +263,424 @@ def find_closest_location(photo_time, locations):
             closest_location = loc
     return closest_location
 
-def process_photos(photo_dir, location_files, progress_callback=None, overwrite=False):
-    """Process photos and add GPS data using unified GPX-style location data."""
-    photo_files = find_photos_recursively(photo_dir)
-    print(f"Found {len(photo_files)} photos.")
+def read_photo(photo_path, overwrite=False, known=None, sidecar=False, stats=None, exif=None):
+    """Stat and probe a photo for process_photo; return (status, message, record, metadata, photo_time).
 
-    all_locations = parse_location_files(location_files)
-    print(f"Loaded {len(all_locations)} location points.")
+    status is None if the photo still needs a location; otherwise it is the
+    photo's final outcome (SKIPPED or ERROR) and message and record are set
+    as in process_photo. exif is the photo's EXIF block if it was read along
+    with known. The header bytes probed are counted in stats, if given.
+    """
+    stat = os.stat(photo_path)
+    if known is not None and known.matches(stat):
+        metadata = ExifSummary(datetime_original=known.datetime_original, has_gps=known.has_gps, exif=exif)
+    else:
+        # Read timestamp and GPS presence in a single pass over the header
+        metadata = probe_photo(photo_path)
+        if stats and metadata.exif:
+            stats.count("bytes_read", len(metadata.exif))
+    record = PhotoRecord(photo_path, stat.st_size, stat.st_mtime_ns, metadata.datetime_original, metadata.has_gps)
 
-    total = len(photo_files)
-    added_count, skipped_count, error_log = 0, 0, []
+    # Skip if GPS data exists and overwrite is not enabled
+    if not overwrite and (metadata.has_gps or (sidecar and read_sidecar_gps(photo_path))):
+        return SKIPPED, None, record, metadata, None
 
-    for i, photo_path in enumerate(photo_files, start=1):
+    # Get photo timestamp
+    photo_time = exif_timestamp(metadata)
+    if not photo_time:
+        return ERROR, f"No timestamp found for: {photo_path}", record, metadata, None
+    return None, None, record, metadata, photo_time
+
+def write_photo(photo_path, record, metadata, location, sidecar=False, stats=None):
+    """Write a matched location for process_photo; return (status, message, record).
+
+    The size of the photo or sidecar written is counted in stats, if given.
+    """
+    if sidecar:
+        write_sidecar_gps(photo_path, location["latitude"], location["longitude"])
+        if stats:
+            stats.count("bytes_written", os.path.getsize(sidecar_path(photo_path)))
+        return ADDED, None, record._replace(latitude=location["latitude"], longitude=location["longitude"])
+    if not add_gps_to_photo(photo_path, location["latitude"], location["longitude"], exif=metadata.exif):
+        return ERROR, f"Failed to add GPS data to: {photo_path}", record
+
+    stat = os.stat(photo_path)
+    if stats:
+        stats.count("bytes_written", stat.st_size)
+    record = record._replace(
+        size=stat.st_size, mtime_ns=stat.st_mtime_ns, has_gps=True,
+        latitude=location["latitude"], longitude=location["longitude"],
+    )
+    return ADDED, None, record
+
+def process_photo(photo_path, location_index, overwrite=False, known=None, sidecar=False, stats=None, exif=None):
+    """Geotag a single photo; return a (status, message, record) triple.
+
+    status is one of ADDED, SKIPPED or ERROR; message is only set for errors.
+    known is the photo's PhotoRecord from a previous run, if any: when the file
+    is unchanged its stored metadata, and exif if given, are used instead of
+    opening the file. record is the up-to-date PhotoRecord to store back in the index.
+    With sidecar, coordinates go to an XMP sidecar and the photo is left untouched.
+    With stats (a RunStats), the probe, match and write stages are timed.
+    """
+    picked_up = mark = stats.start() if stats else None
+    try:
+        status, message, record, metadata, photo_time = read_photo(photo_path, overwrite, known, sidecar, stats, exif)
+        if stats:
+            mark = stats.lap("probe", mark)
+        if status is None:
+            # Find the closest location data
+            closest = location_index.match(photo_time)
+            if stats:
+                mark = stats.lap("match", mark)
+            if not closest:
+                status, message = ERROR, f"No location data found for: {photo_path}"
+            else:
+                status, message, record = write_photo(photo_path, record, metadata, closest, sidecar, stats)
+                if stats:
+                    stats.lap("write", mark)
+    except Exception as e:
+        status, message, record = ERROR, f"Error processing {photo_path}: {e}", None
+    if stats:
+        stats.photo_done(picked_up[0])
+    return status, message, record
+
+def _put(q, item, stop):
+    """Put item on a bounded queue, waiting for room unless stop is set; return whether it was put."""
+    while not stop.is_set():
         try:
-            # Skip if GPS data exists and overwrite is not enabled
-            if not overwrite and has_gps_data(photo_path):
-                skipped_count += 1
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop):
+    """Take the next item from a queue, or _DONE once stop is set."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+# End-of-stream marker passed between pipeline stages
+_DONE = object()
+
+def _iter_results_pipelined(tasks, location_index, overwrite=False, sidecar=False, io_threads=PIPELINE_THREADS, cancel=None,
+                            stats=None):
+    """Yield per-photo results from a reader -> matcher -> writer thread pipeline.
+
+    tasks is an iterable of (photo_path, known, exif) triples and is consumed lazily.
+
+    io_threads reader threads stat and probe photos, one matcher thread looks
+    up their locations in batches, and io_threads writer threads write them,
+    so disk reads, EXIF work and writes overlap. The stages are joined by
+    bounded queues, so fast readers wait for slow writers instead of
+    buffering the whole library. Results come in completion order.
+
+    If cancel (a threading.Event) is set, no further photos are started, and
+    those already read are still matched, written and yielded before the
+    generator ends. An unexpected error in
+    any stage stops the others and is re-raised here. With stats (a
+    RunStats), each stage is timed in the threads that run it.
+    """
+    tasks = iter(tasks)
+    tasks_lock = threading.Lock()
+    to_match = queue.Queue(PIPELINE_QUEUE_SIZE)
+    to_write = queue.Queue(PIPELINE_QUEUE_SIZE)
+    results = queue.Queue()  # Unbounded so that no stage can block on a consumer that went away
+    stop = threading.Event()
+    errors = []
+
+    def finish(result, picked_up):
+        results.put(result)
+        if stats:
+            stats.photo_done(picked_up[0])
+
+    def read():
+        while not stop.is_set() and not (cancel is not None and cancel.is_set()):
+            # tasks may be a discovery generator, which only one thread can advance at a time
+            with tasks_lock:
+                task = next(tasks, None)
+            if task is None:
+                break
+            photo_path, known, exif = task
+            picked_up = stats.start() if stats else None
+            try:
+                status, message, record, metadata, photo_time = read_photo(photo_path, overwrite, known, sidecar, stats, exif)
+            except Exception as e:
+                finish((ERROR, f"Error processing {photo_path}: {e}", None), picked_up)
                 continue
+            finally:
+                if stats:
+                    stats.lap("probe", picked_up)
+            if status is not None:
+                finish((status, message, record), picked_up)
+            elif not _put(to_match, (photo_path, record, metadata, photo_time, picked_up), stop):
+                return
+        _put(to_match, _DONE, stop)
+
+    def match():
+        finished = 0
+        while finished < io_threads:
+            # Match whatever the readers have queued up in one batched lookup
+            batch = [_get(to_match, stop)]
+            while len(batch) < PIPELINE_QUEUE_SIZE:
+                try:
+                    batch.append(to_match.get_nowait())
+                except queue.Empty:
+                    break
+            if stop.is_set():
+                return
+            items = [item for item in batch if item is not _DONE]
+            finished += len(batch) - len(items)
+            mark = stats.start() if stats else None
+            locations = location_index.match_many([photo_time for _, _, _, photo_time, _ in items])
+            if stats:
+                stats.lap("match", mark, calls=len(items))
+            for (photo_path, record, metadata, _, picked_up), location in zip(items, locations):
+                if not location:
+                    finish((ERROR, f"No location data found for: {photo_path}", record), picked_up)
+                elif not _put(to_write, (photo_path, record, metadata, location, picked_up), stop):
+                    return
+        for _ in range(io_threads):
+            _put(to_write, _DONE, stop)
 
-            # Get photo timestamp
-            photo_time = get_photo_timestamp(photo_path)
-            if not photo_time:
-                error_log.append(f"No timestamp found for: {photo_path}")
+    def write():
+        while True:
+            item = _get(to_write, stop)
+            if item is _DONE:
+                return
+            photo_path, record, metadata, location, picked_up = item
+            mark = stats.start() if stats else None
+            try:
+                result = write_photo(photo_path, record, metadata, location, sidecar, stats)
+            except Exception as e:
+                result = ERROR, f"Error processing {photo_path}: {e}", None
+            if stats:
+                stats.lap("write", mark)
+            finish(result, picked_up)
+
+    def run(stage):
+        try:
+            stage()
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            results.put(_DONE)
+
+    stages = [read] * io_threads + [match] + [write] * io_threads
+    threads = [threading.Thread(target=run, args=(stage,), daemon=True) for stage in stages]
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = len(threads)
+        while running:
+            try:
+                result = results.get(timeout=0.1)
+            except queue.Empty:
                 continue
+            if result is _DONE:
+                running -= 1
+            else:
+                yield result
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
 
-            # Find the closest location data
-            closest = find_closest_location(photo_time, all_locations)
-            if closest:
-                add_gps_to_photo(photo_path, closest["latitude"], closest["longitude"])
+# Location index of a worker process, attached once by _init_worker
+_worker_index = None
+
+def _init_worker(shared_track, interpolation, max_gap):
+    global _worker_index
+    _worker_index = make_index(LocationTrack.from_shared(shared_track), interpolation, max_gap)
+
+def _process_chunk(tasks, overwrite, sidecar, timed):
+    stats = RunStats() if timed else None
+    results = [
+        process_photo(photo_path, _worker_index, overwrite, known, sidecar, stats, exif) for photo_path, known, exif in tasks
+    ]
+    return results, stats.snapshot() if stats else None
+
+def _iter_results_parallel(tasks, all_locations, overwrite, jobs, sidecar=False, interpolation=None, max_gap=None, stats=None):
+    """Yield per-photo results in input order, computed by a pool of worker processes.
+
+    tasks is consumed lazily, with only a few chunks per worker in flight.
+    The workers' stage timings are merged into stats, if given.
+    """
+    tasks = iter(tasks)
+    in_flight = deque()
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(all_locations.share(), interpolation, max_gap))
+    try:
+        # Start the workers before tasks starts the discovery threads: a worker
+        # forked while one of them holds a lock (such as stdout's) could deadlock
+        pool.submit(int)
+        while True:
+            while len(in_flight) < jobs * 4:
+                chunk = list(islice(tasks, PARALLEL_CHUNK_SIZE))
+                if not chunk:
+                    break
+                in_flight.append(pool.submit(_process_chunk, chunk, overwrite, sidecar, stats is not None))
+            if not in_flight:
+                return
+            results, snapshot = in_flight.popleft().result()
+            if snapshot:
+                stats.merge(snapshot)
+            yield from results
+    finally:
+        # Drop queued chunks if the caller stops early
+        pool.shutdown(cancel_futures=True)
+
+def process_photos(photo_dir, location_files, progress_callback=None, overwrite=False, jobs=1, use_cache=True,
+                   use_index=True, window_tolerance=None, sidecar=False, interpolation=None, max_gap=None,
+                   io_threads=PIPELINE_THREADS, cancel=None, scan_threads=1, resume=False, journal_path=None, stats=None):
+    """Process photos and add GPS data using unified GPX-style location data.
+
+    Photos are discovered while earlier ones are processed, so
+    progress_callback(processed, discovered, total) receives the number of
+    photos found so far, and total is None until discovery has finished and
+    equal to discovered after that. With scan_threads > 1, the
+    top-level subdirectories of photo_dir are searched concurrently.
+
+    With jobs > 1 photos are handled by that many worker processes which share
+    the parsed location track without copying it. With use_index, what is
+    learned about each photo is kept in a PhotoIndex so that later runs skip
+    unchanged photos without opening them.
+
+    If window_tolerance (a timedelta) is given, the photos' capture times are
+    collected first and only location points within window_tolerance of that
+    range are loaded, which keeps small jobs against long histories cheap.
+
+    With sidecar, coordinates are written to XMP sidecar files next to the
+    photos instead of into the JPEGs, and existing sidecars count as GPS data.
+
+    interpolation ("linear" or "great-circle") places each photo between the
+    two track points around it instead of snapping it to the nearest one;
+    photos in gaps longer than max_gap (a timedelta) are left untagged.
+
+    With jobs == 1, photos go through a pipeline of io_threads reader threads,
+    a matcher and io_threads writer threads so that disk I/O and EXIF work
+    overlap; io_threads=0 handles them one after another instead. Setting
+    cancel (a threading.Event) stops the run after the photos in progress.
+
+    Finished photos are recorded in a RunJournal (by default one per
+    photo_dir in the cache directory) that is deleted when the run completes.
+    With resume, photos recorded by an interrupted earlier run are skipped
+    without being opened; photos that failed are retried.
+
+    Pass a RunStats as stats to have the run's per-stage timings, counters
+    and photo latencies collected into it; without one nothing is timed.
+    """
+    journal = RunJournal(journal_path or default_journal_path(photo_dir), resume=resume)
+    if len(journal):
+        print(f"Resuming: skipping {len(journal)} photos finished by the previous run.")
+    photo_index = PhotoIndex() if use_index else None
+    discovered = 0
+    total = None
+
+    def discover():
+        nonlocal discovered, total
+        for photo_path in iter_photos(photo_dir, scan_threads):
+            if photo_path in journal:
+                continue
+            discovered += 1
+            yield photo_path, photo_index.lookup(photo_path) if photo_index else None, None
+        total = discovered
+
+    # Photos are found while earlier ones are already being processed
+    tasks = stats.timed_iter(discover(), "discover") if stats else discover()
+
+    if window_tolerance is not None:
+        tasks = list(tasks)
+        mark = stats.start() if stats else None
+        tasks, window = prescan_photos(tasks, overwrite, window_tolerance, sidecar, stats)
+        if stats:
+            stats.lap("prescan", mark, calls=len(tasks))
+    mark = stats.start() if stats else None
+    if window_tolerance is not None and window is None:
+        all_locations = LocationTrack()
+    elif window_tolerance is not None:
+        print(f"Loading location points between {window[0].isoformat()} and {window[1].isoformat()}.")
+        all_locations = parse_location_files(location_files, use_cache=use_cache, window=window, jobs=jobs)
+    else:
+        all_locations = parse_location_files(location_files, use_cache=use_cache, jobs=jobs)
+    if stats:
+        stats.lap("load_locations", mark, calls=len(location_files))
+        stats.count("location_points", len(all_locations))
+    print(f"Loaded {len(all_locations)} location points.")
+
+    pipeline = None
+    if jobs > 1:
+        results = _iter_results_parallel(tasks, all_locations, overwrite, jobs, sidecar, interpolation, max_gap, stats)
+    elif io_threads > 0:
+        location_index = make_index(all_locations, interpolation, max_gap)
+        results = pipeline = _iter_results_pipelined(tasks, location_index, overwrite, sidecar, io_threads, cancel, stats)
+    else:
+        location_index = make_index(all_locations, interpolation, max_gap)
+        results = (
+            process_photo(photo_path, location_index, overwrite, known, sidecar, stats, exif) for photo_path, known, exif in tasks
+        )
+
+    def update_index(records):
+        mark = stats.start() if stats else None
+        photo_index.update(records)
+        if stats:
+            stats.lap("index", mark, calls=len(records))
+
+    added_count, skipped_count, error_log = 0, 0, []
+    pending_records = []
+    finished = False
+    processed = 0
+
+    try:
+        for processed, (status, message, record) in enumerate(results, start=1):
+            if status == ADDED:
                 added_count += 1
+            elif status == SKIPPED:
+                skipped_count += 1
             else:
-                error_log.append(f"No location data found for: {photo_path}")
-        except Exception as e:
-            error_log.append(f"Error processing {photo_path}: {e}")
+                error_log.append(message)
+            if status != ERROR:
+                journal.record(record.path)
 
-        # Update progress
-        if progress_callback:
-            progress_callback(i, total)
+            if photo_index and record:
+                pending_records.append(record)
+                if len(pending_records) >= INDEX_BATCH_SIZE:
+                    update_index(pending_records)
+                    pending_records = []
 
+            # Update progress
+            if progress_callback:
+                progress_callback(processed, discovered, total)
+            # The pipeline winds down by itself and still reports the photos in flight
+            if cancel is not None and cancel.is_set() and results is not pipeline:
+                break
+        finished = cancel is None or not cancel.is_set()
+        # Discovery only ends once the last result has been taken, so report the final total
+        if progress_callback and total is not None:
+            progress_callback(processed, discovered, total)
+    finally:
+        # Stop the workers if the loop ended early
+        results.close()
+        # Keep the journal of an interrupted run so that it can be resumed
+        journal.close(finished=finished)
+        if photo_index:
+            update_index(pending_records)
+            photo_index.close()
+        if stats:
+            stats.finish()
+
+    print(f"Found {discovered} photos.")
     return added_count, skipped_count, error_log
 
-def export_to_gpx(locations, output_file):
-    """Export unified location data to a GPX file."""
-    import xml.etree.ElementTree as ET
-
-    gpx = ET.Element("gpx", attrib={
-        "version": "1.1",
-        "creator": "Adocate",
-        "xmlns": "http://www.topografix.com/GPX/1/1",
-        "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
-        "xsi:schemaLocation": (
-            "http://www.topografix.com/GPX/1/1 "
-            "http://www.topografix.com/GPX/1/1/gpx.xsd"
-        ),
-    })
-
-    trk = ET.SubElement(gpx, "trk")
-    ET.SubElement(trk, "name").text = "Combined Location Data"
-
-    trkseg = ET.SubElement(trk, "trkseg")
-    for loc in locations:
-        trkpt = ET.SubElement(trkseg, "trkpt", attrib={
-            "lat": f"{loc['latitude']}",
-            "lon": f"{loc['longitude']}"
-        })
-        ET.SubElement(trkpt, "time").text = loc["timestamp"].isoformat()
-
-    tree = ET.ElementTree(gpx)
-    tree.write(output_file, encoding="utf-8", xml_declaration=True)
+def export_to_gpx(locations, output_file, segment_gap=None):
+    """Export unified location data to a GPX file, streaming it point by point."""
+    if not isinstance(locations, LocationTrack):
+        locations = LocationTrack.from_locations(locations)
+    export_locations(locations, output_file, "gpx", segment_gap)
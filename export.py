@@ -0,0 +1,219 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Union
+
+from track import EPOCH, LocationTrack
+
+EXPORT_FORMATS = ("gpx", "csv", "geojsonl")
+# File extensions each format is recognised by, the first one being used for new files
+EXTENSIONS = {"gpx": (".gpx",), "csv": (".csv",), "geojsonl": (".geojsonl", ".geojsons", ".jsonl")}
+
+# Points formatted before each write, and the size of the file buffer behind it
+WRITE_BATCH_SIZE = 4096
+WRITE_BUFFER_SIZE = 1 << 20
+
+DAY_MS = 86_400_000
+
+GPX_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<gpx version="1.1" creator="Adocate" xmlns="http://www.topografix.com/GPX/1/1" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd">\n'
+    "<trk><name>Combined Location Data</name>\n"
+)
+
+
+class _Timestamps:
+    """Format epoch milliseconds as ISO 8601 UTC strings, building each day's date part once."""
+
+    def __init__(self):
+        self.day = None
+        self.prefix = None
+
+    def format(self, epoch_ms: int) -> str:
+        day, ms = divmod(epoch_ms, DAY_MS)
+        if day != self.day:
+            self.day = day
+            self.prefix = (EPOCH + timedelta(days=day)).strftime("%Y-%m-%dT")
+        seconds, ms = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        if ms:
+            return f"{self.prefix}{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}Z"
+        return f"{self.prefix}{hours:02d}:{minutes:02d}:{seconds:02d}Z"
+
+
+class GPXFormat:
+    """GPX 1.1 with one track whose segments are split at time gaps."""
+
+    def header(self) -> str:
+        return GPX_HEADER + "<trkseg>\n"
+
+    def segment_break(self) -> str:
+        return "</trkseg>\n<trkseg>\n"
+
+    def point(self, time: str, latitude_e7: int, longitude_e7: int, segment: int) -> str:
+        return f'<trkpt lat="{latitude_e7 / 1e7:.7f}" lon="{longitude_e7 / 1e7:.7f}"><time>{time}</time></trkpt>\n'
+
+    def footer(self) -> str:
+        return "</trkseg>\n</trk>\n</gpx>\n"
+
+
+class CSVFormat:
+    """Comma-separated time, latitude, longitude and segment number."""
+
+    def header(self) -> str:
+        return "time,latitude,longitude,segment\n"
+
+    def segment_break(self) -> str:
+        return ""
+
+    def point(self, time: str, latitude_e7: int, longitude_e7: int, segment: int) -> str:
+        return f"{time},{latitude_e7 / 1e7:.7f},{longitude_e7 / 1e7:.7f},{segment}\n"
+
+    def footer(self) -> str:
+        return ""
+
+
+class GeoJSONLinesFormat:
+    """One GeoJSON Point feature per line, with the time and segment number as properties."""
+
+    def header(self) -> str:
+        return ""
+
+    def segment_break(self) -> str:
+        return ""
+
+    def point(self, time: str, latitude_e7: int, longitude_e7: int, segment: int) -> str:
+        return (
+            f'{{"type":"Feature","geometry":{{"type":"Point","coordinates":[{longitude_e7 / 1e7:.7f},{latitude_e7 / 1e7:.7f}]}},'
+            f'"properties":{{"time":"{time}","segment":{segment}}}}}\n'
+        )
+
+    def footer(self) -> str:
+        return ""
+
+
+FORMATS = {"gpx": GPXFormat, "csv": CSVFormat, "geojsonl": GeoJSONLinesFormat}
+
+
+def format_for_path(output_path: str) -> str:
+    """Return the export format matching output_path's extension, defaulting to GPX."""
+    extension = os.path.splitext(output_path)[1].lower()
+    for name, extensions in EXTENSIONS.items():
+        if extension in extensions:
+            return name
+    return "gpx"
+
+
+def _month(epoch_ms: int) -> str:
+    return (EPOCH + timedelta(milliseconds=epoch_ms)).strftime("%Y-%m")
+
+
+def _next_month_ms(epoch_ms: int) -> int:
+    start = EPOCH + timedelta(milliseconds=epoch_ms)
+    year, month = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+    return (datetime(year, month, 1, tzinfo=timezone.utc) - EPOCH) // timedelta(milliseconds=1)
+
+
+class _RollingOutput:
+    """Output file that rolls over into numbered or monthly parts."""
+
+    def __init__(self, output_path: str, format_name: str, by_month: bool, max_bytes: Optional[int]):
+        self.stem, self.extension = os.path.splitext(output_path)
+        self.extension = self.extension or EXTENSIONS[format_name][0]
+        self.output_format = FORMATS[format_name]()
+        self.by_month = by_month
+        self.max_bytes = max_bytes
+        self.file = None
+        self.size = 0
+        self.month = None
+        self.part = 0
+        self.paths = []
+
+    def _name(self) -> str:
+        name = self.stem
+        if self.by_month:
+            name += f"-{self.month}"
+        if self.max_bytes:
+            name += f"-{self.part:03d}"
+        return name + self.extension
+
+    def open(self, month: Optional[str] = None):
+        """Start the next part, which is the first of a new month if month is given."""
+        self.close()
+        if month is not None:
+            self.month, self.part = month, 0
+        self.part += 1
+        path = self._name()
+        self.file = open(path, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE)
+        self.size = 0
+        self.write(self.output_format.header())
+        self.paths.append(path)
+
+    def write(self, text: str):
+        # Exports are ASCII, so characters written equal bytes written
+        self.file.write(text)
+        self.size += len(text)
+
+    def close(self):
+        if self.file is not None:
+            self.file.write(self.output_format.footer())
+            self.file.close()
+            self.file = None
+
+
+def export_locations(locations: Union[LocationTrack, Iterable[LocationTrack]], output_path: str,
+                     output_format: Optional[str] = None, segment_gap: Optional[timedelta] = None,
+                     by_month: bool = False, max_bytes: Optional[int] = None) -> List[str]:
+    """Stream time-sorted locations to a GPX, CSV or GeoJSON-lines file; return the paths written.
+
+    locations is a track or an iterable of consecutive tracks, such as the
+    batches of LocationParserFactory.stream. Points are formatted in small
+    batches straight from the track's columns, so memory use does not grow
+    with the number of points. A new segment starts wherever consecutive
+    points are more than segment_gap apart. With by_month, each calendar month
+    (UTC) goes to its own file, and with max_bytes a file is continued in a
+    new part once it reaches that size; parts are named after output_path
+    with the month and/or a part number appended, and a by-month export of no
+    points writes no file. output_format defaults to the one matching
+    output_path's extension.
+    """
+    output = _RollingOutput(output_path, output_format or format_for_path(output_path), by_month, max_bytes)
+    output_format = output.output_format
+    if isinstance(locations, LocationTrack):
+        locations = (locations,)
+    gap_ms = segment_gap // timedelta(milliseconds=1) if segment_gap is not None else None
+    timestamps = _Timestamps()
+
+    previous, segment, month_end = None, 0, None
+    try:
+        if not by_month:
+            output.open()
+        for track in locations:
+            for start in range(0, len(track), WRITE_BATCH_SIZE):
+                end = start + WRITE_BATCH_SIZE
+                lines, pending = [], 0
+                for ts, lat, lng in zip(track.timestamps[start:end], track.latitudes[start:end], track.longitudes[start:end]):
+                    if by_month and (month_end is None or ts >= month_end):
+                        if lines:
+                            output.write("".join(lines))
+                            lines, pending = [], 0
+                        output.open(_month(ts))
+                        month_end, previous = _next_month_ms(ts), None
+                    elif max_bytes is not None and output.size + pending >= max_bytes:
+                        output.write("".join(lines))
+                        lines, pending = [], 0
+                        output.open()
+                        previous = None
+                    if gap_ms is not None and previous is not None and ts - previous > gap_ms:
+                        segment += 1
+                        lines.append(output_format.segment_break())
+                    previous = ts
+                    line = output_format.point(timestamps.format(ts), lat, lng, segment)
+                    lines.append(line)
+                    pending += len(line)
+                output.write("".join(lines))
+    finally:
+        output.close()
+    return output.paths
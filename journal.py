@@ -0,0 +1,83 @@
+import hashlib
+import os
+import time
+from typing import Set
+
+from cache import default_cache_dir
+
+# Finished photos buffered before a write, and the longest time between fsyncs
+JOURNAL_BATCH_SIZE = 256
+JOURNAL_FSYNC_INTERVAL = 5.0
+
+
+def default_journal_path(photo_dir: str) -> str:
+    """Return the journal path for runs over photo_dir, in the cache directory."""
+    key = hashlib.sha1(os.path.abspath(photo_dir).encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(default_cache_dir(), "journals", f"{key}.journal")
+
+
+class RunJournal:
+    """Append-only list of the photos a run has finished, so an interrupted run can be resumed.
+
+    Paths are buffered and written in batches, and the file is fsynced at
+    most every fsync_interval seconds, so recording a photo costs next to
+    nothing. A crash loses at most the last unsynced batch, whose photos are
+    simply processed again. A run that finishes deletes its journal.
+    """
+
+    def __init__(self, path: str, resume: bool = False, batch_size: int = JOURNAL_BATCH_SIZE,
+                 fsync_interval: float = JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.done = self._load(path) if resume else set()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8", errors="surrogateescape")
+        if resume and self.file.tell() > 0:
+            # Terminate a line torn by a crash so the next path starts on its own line
+            self.file.write("\n")
+        self.pending = []
+        self.last_sync = time.monotonic()
+
+    @staticmethod
+    def _load(path: str) -> Set[str]:
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return set()
+        # The last element is empty after a complete line, or a torn partial path
+        return {line for line in lines[:-1] if line}
+
+    def __contains__(self, photo_path: str) -> bool:
+        """Check whether a previous run finished photo_path."""
+        return os.path.abspath(photo_path) in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, photo_path: str):
+        """Note that photo_path is finished."""
+        self.pending.append(os.path.abspath(photo_path) + "\n")
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self, sync: bool = False):
+        """Write buffered paths, fsyncing if sync is set or the interval has passed."""
+        if self.pending:
+            self.file.write("".join(self.pending))
+            self.pending = []
+        self.file.flush()
+        now = time.monotonic()
+        if sync or now - self.last_sync >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.last_sync = now
+
+    def close(self, finished: bool = False):
+        """Close the journal, deleting it if the run finished and keeping it durable otherwise."""
+        if finished:
+            self.file.close()
+            os.remove(self.path)
+        else:
+            self.flush(sync=True)
+            self.file.close()
@@ -0,0 +1,262 @@
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+SOI = b"\xff\xd8"
+SOS = 0xDA
+EOI = 0xD9
+APP0 = 0xE0
+APP1 = 0xE1
+MAX_SEGMENT_PAYLOAD = 0xFFFF - 2
+COPY_CHUNK = 1 << 24
+EXIF_HEADER = b"Exif\x00\x00"
+
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+TAG_GPS_LATITUDE = 2
+TAG_GPS_LONGITUDE = 4
+
+TYPE_ASCII = 2
+TYPE_LONG = 4
+TYPE_IFD = 13
+
+
+class ExifSummary(NamedTuple):
+    """The few EXIF fields Adocate needs, read in one pass over the JPEG header."""
+
+    datetime_original: Optional[str] = None
+    subsec_time_original: Optional[str] = None
+    offset_time_original: Optional[str] = None
+    has_gps: bool = False
+    exif: Optional[bytes] = None  # Raw APP1 payload, starting with the Exif header
+
+
+def read_exif_segment(f: BinaryIO) -> Optional[bytes]:
+    """Return the Exif APP1 payload, reading only the segments in front of it."""
+    if f.read(2) != SOI:
+        raise ValueError("Not a JPEG file.")
+
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            raise ValueError("Corrupt JPEG marker.")
+        marker = f.read(1)
+        while marker == b"\xff":  # Fill bytes
+            marker = f.read(1)
+        if not marker or marker[0] in (SOS, EOI):
+            return None
+
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack(">H", header)[0] - 2
+        if marker[0] == APP1:
+            payload = f.read(length)
+            if payload.startswith(EXIF_HEADER):
+                return payload
+        else:
+            f.seek(length, 1)
+
+
+def _read_ifd(tiff: bytes, offset: int, endian: str) -> Dict[int, Tuple[int, int, bytes]]:
+    """Map each tag of the IFD at offset to (type, count, 4-byte value field)."""
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    entries = {}
+    for i in range(count):
+        start = offset + 2 + i * 12
+        tag, value_type, value_count = struct.unpack_from(endian + "HHI", tiff, start)
+        entries[tag] = (value_type, value_count, tiff[start + 8:start + 12])
+    return entries
+
+
+def _ascii(tiff: bytes, entry: Tuple[int, int, bytes], endian: str) -> Optional[str]:
+    value_type, value_count, field = entry
+    if value_type != TYPE_ASCII:
+        return None
+    if value_count > 4:
+        offset = struct.unpack(endian + "I", field)[0]
+        field = tiff[offset:offset + value_count]
+    return field[:value_count].split(b"\x00", 1)[0].decode("ascii", "replace").strip() or None
+
+
+def _pointer(entries: Dict[int, Tuple[int, int, bytes]], tag: int, endian: str) -> Optional[int]:
+    entry = entries.get(tag)
+    # Sub-IFD pointers are usually LONGs, but the IFD type is also allowed
+    if entry is None or entry[0] not in (TYPE_LONG, TYPE_IFD):
+        return None
+    return struct.unpack(endian + "I", entry[2])[0]
+
+
+def summarize_exif(exif: bytes) -> ExifSummary:
+    """Extract the capture time fields and GPS presence from an Exif APP1 payload."""
+    tiff = exif[len(EXIF_HEADER):]
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Invalid TIFF header in EXIF data.")
+
+    ifd0 = _read_ifd(tiff, struct.unpack_from(endian + "I", tiff, 4)[0], endian)
+
+    datetime_original = subsec = offset = None
+    exif_ifd_offset = _pointer(ifd0, TAG_EXIF_IFD, endian)
+    if exif_ifd_offset:
+        exif_ifd = _read_ifd(tiff, exif_ifd_offset, endian)
+        if TAG_DATETIME_ORIGINAL in exif_ifd:
+            datetime_original = _ascii(tiff, exif_ifd[TAG_DATETIME_ORIGINAL], endian)
+        if TAG_SUBSEC_TIME_ORIGINAL in exif_ifd:
+            subsec = _ascii(tiff, exif_ifd[TAG_SUBSEC_TIME_ORIGINAL], endian)
+        if TAG_OFFSET_TIME_ORIGINAL in exif_ifd:
+            offset = _ascii(tiff, exif_ifd[TAG_OFFSET_TIME_ORIGINAL], endian)
+
+    has_gps = False
+    gps_ifd_offset = _pointer(ifd0, TAG_GPS_IFD, endian)
+    if gps_ifd_offset:
+        gps_ifd = _read_ifd(tiff, gps_ifd_offset, endian)
+        has_gps = TAG_GPS_LATITUDE in gps_ifd and TAG_GPS_LONGITUDE in gps_ifd
+
+    return ExifSummary(datetime_original, subsec, offset, has_gps, exif)
+
+
+def probe_jpeg(photo_path: str) -> ExifSummary:
+    """Read a JPEG's header segments once and summarise its EXIF block."""
+    with open(photo_path, "rb") as f:
+        exif = read_exif_segment(f)
+    if exif is None:
+        return ExifSummary()
+    return summarize_exif(exif)
+
+
+class Segment(NamedTuple):
+    """A marker segment in a JPEG header."""
+
+    marker: int
+    offset: int  # Offset of the 0xFF marker byte
+    length: int  # Whole segment including marker and length field
+
+
+def scan_segments(f: BinaryIO) -> Tuple[List[Segment], int]:
+    """List the header segments in front of the image data.
+
+    Returns the segments and the offset of the SOS marker, where the
+    entropy-coded data (which is never modified) begins.
+    """
+    if f.read(2) != SOI:
+        raise ValueError("Not a JPEG file.")
+
+    segments = []
+    offset = 2
+    while True:
+        f.seek(offset)
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Corrupt JPEG marker.")
+        if marker[1] == 0xFF:  # Fill byte
+            offset += 1
+            continue
+        if marker[1] == SOS:
+            return segments, offset
+        if marker[1] == EOI:
+            raise ValueError("JPEG file has no image data.")
+        length = struct.unpack(">H", f.read(2))[0]
+        segments.append(Segment(marker[1], offset, length + 2))
+        offset += length + 2
+
+
+def _is_exif(f: BinaryIO, segment: Segment) -> bool:
+    if segment.marker != APP1:
+        return False
+    f.seek(segment.offset + 4)
+    return f.read(len(EXIF_HEADER)) == EXIF_HEADER
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int):
+    """Copy src from offset to its end onto dst's current position, in the kernel where possible."""
+    src.flush()
+    dst.flush()
+    size = os.fstat(src.fileno()).st_size
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    out_offset = dst.tell()
+    for copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copy is None:
+            continue
+        try:
+            while offset < size:
+                if copy is os.sendfile:
+                    os.lseek(dst_fd, out_offset, os.SEEK_SET)
+                    copied = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK, size - offset))
+                else:
+                    copied = copy(src_fd, dst_fd, min(COPY_CHUNK, size - offset), offset, out_offset)
+                if copied == 0:
+                    break
+                offset += copied
+                out_offset += copied
+            dst.seek(out_offset)
+            return
+        except OSError:
+            # Unsupported between these file systems; continue from where it stopped
+            continue
+    src.seek(offset)
+    dst.seek(out_offset)
+    shutil.copyfileobj(src, dst, COPY_CHUNK)
+
+
+def write_exif(photo_path: str, exif: bytes, in_place: bool = False):
+    """Replace (or add) a JPEG's Exif APP1 segment without touching the image data.
+
+    Only the header segments are rewritten into a temporary file, the image
+    data is bulk-copied behind them, and the result is synced and atomically
+    renamed over the original, so an interrupted write never leaves a torn
+    EXIF block behind. With in_place, an existing APP1 large enough for exif
+    is instead overwritten where it is, zero-padded and synced; that is
+    cheaper but not safe against a crash during the write.
+    """
+    if not exif.startswith(EXIF_HEADER):
+        raise ValueError("Given data is not EXIF data.")
+    if len(exif) > MAX_SEGMENT_PAYLOAD:
+        raise ValueError("EXIF data does not fit in a JPEG APP1 segment.")
+
+    with open(photo_path, "rb") as src:
+        segments, data_offset = scan_segments(src)
+        existing = next((segment for segment in segments if _is_exif(src, segment)), None)
+
+        if in_place and existing is not None and len(exif) <= existing.length - 4:
+            src.close()
+            with open(photo_path, "r+b") as f:
+                f.seek(existing.offset + 4)
+                f.write(exif.ljust(existing.length - 4, b"\0"))
+                f.flush()
+                os.fsync(f.fileno())
+            return
+
+        app1 = b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+        src.seek(0)
+        header = src.read(data_offset)
+        if existing is not None:
+            new_header = header[:existing.offset] + app1 + header[existing.offset + existing.length:]
+        else:
+            # Keep a leading JFIF APP0 first, as its specification requires
+            insert_at = segments[0].offset + segments[0].length if segments and segments[0].marker == APP0 else 2
+            new_header = header[:insert_at] + app1 + header[insert_at:]
+
+        directory, name = os.path.split(os.path.abspath(photo_path))
+        fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                dst.write(new_header)
+                _copy_range(src, dst, data_offset)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copymode(photo_path, temp_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    os.replace(temp_path, photo_path)
@@ -0,0 +1,68 @@
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+# Environment variable that forces a backend, also read by worker processes
+BACKEND_VARIABLE = "ADOCATE_JSON_BACKEND"
+
+# Supported backends, fastest first; "json" is the standard library and always available
+BACKENDS = ("orjson", "json")
+
+
+def _import(name: str) -> Optional[Callable[[str], Any]]:
+    """Return the loads function of backend name, or None if it is not installed."""
+    if name == "json":
+        return json.loads
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return orjson.loads
+    raise ValueError(f"Unknown JSON backend {name!r}; choose from {', '.join(BACKENDS)}.")
+
+
+def available_backends() -> List[str]:
+    """Return the installed backends, fastest first."""
+    return [name for name in BACKENDS if _import(name) is not None]
+
+
+_current: Dict[str, Any] = {}
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """Switch to backend name, or to the fastest installed one; return the backend's name.
+
+    Without a name, ADOCATE_JSON_BACKEND is honoured if set. A backend that is
+    unknown or not installed raises ValueError. A backend chosen by name is
+    also exported to the environment so that worker processes use it too.
+    """
+    chosen = name or os.environ.get(BACKEND_VARIABLE) or available_backends()[0]
+    loads = _import(chosen)
+    if loads is None:
+        raise ValueError(f"JSON backend {chosen!r} is not installed.")
+    if name is not None:
+        os.environ[BACKEND_VARIABLE] = name
+    _current.update(name=chosen, loads=loads)
+    return chosen
+
+
+def backend() -> str:
+    """Return the name of the backend in use."""
+    return _current["name"]
+
+
+def fast_loads() -> Optional[Callable[[str], Any]]:
+    """Return the loads function of the backend in use, or None when it is the standard library.
+
+    The standard library can decode straight out of a stream buffer, which
+    other backends cannot, so the JSON readers only batch text up for them.
+    """
+    return None if _current["name"] == "json" else _current["loads"]
+
+
+try:
+    select_backend()
+except ValueError as e:
+    print(f"{e} Using the fastest installed JSON backend instead.")
+    select_backend(available_backends()[0])
@@ -0,0 +1,242 @@
+import json
+import re
+from typing import Any, Callable, Iterator, List, Optional, TextIO
+
+import jsonbackend
+
+CHUNK_SIZE = 1 << 20
+# Closing brackets tried as the end of a batch before decode_batch gives up
+BATCH_ATTEMPTS = 4
+# Elements decoded one by one by the standard library after decode_batch gives up
+SLOW_ELEMENTS = 1000
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Errors this close to the end of the buffer may just be a value cut off by it; "-Infinity" is the longest token
+TRUNCATION_MARGIN = len("-Infinity")
+# What may follow a number's decoded prefix if the number continues past the buffer
+_NUMBER_TAIL = re.compile(r"[0-9eE.+\-]*\Z")
+# Integers this long may not fit in 64 bits, which some backends decode as floats; digits are mapped
+# to "0" and everything else to " " so that a long run of digits can be found with a substring search
+_LONG_DIGITS = b"0" * 19
+_DIGIT_TABLE = bytes(48 if 48 <= i <= 57 else 32 for i in range(256))
+
+
+class JSONStreamReader:
+    """Incremental reader over a JSON text file held in a sliding buffer.
+
+    Only the unconsumed tail of the file is kept in memory, so walking a large
+    array costs roughly one chunk plus the largest single element.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read another chunk into the buffer; return False at end of file."""
+        if self.eof:
+            return False
+        # Drop consumed text; offsets relative to self.pos stay valid
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        self.skip_whitespace()
+        if self.pos >= len(self.buf):
+            raise ValueError("Unexpected end of JSON input.")
+        return self.buf[self.pos]
+
+    def expect(self, char: str):
+        """Consume the next non-whitespace character, which must be char."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r} in JSON input.")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        """Decode one complete JSON value at the current position."""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Anything else is malformed however much more is read
+                if not self._truncated(e) or not self.fill():
+                    raise
+                continue
+            # A bare number cut off at the buffer edge, even inside its fraction or exponent, decodes "successfully"
+            if _NUMBER_TAIL.match(self.buf, end) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def _truncated(self, error: json.JSONDecodeError) -> bool:
+        """Return whether error may come from the value running past the end of the buffer."""
+        return error.pos >= len(self.buf) - TRUNCATION_MARGIN or error.msg.startswith("Unterminated string")
+
+    def decode_batch(self, loads: Callable[[bytes], Any]) -> Optional[List[Any]]:
+        """Decode the complete array elements in the buffer with one call to loads, or return None.
+
+        The reader must sit at the start of an array element. The batch is
+        cut after one of the last closing brackets in the buffer; the text up
+        to it only decodes as a list if it is a run of complete elements, so
+        if it does not, the next bracket back is tried. None, with nothing
+        consumed, means no batch was found within a few attempts, or the
+        text holds values the backend would decode differently from the
+        standard library: integers beyond 64 bits, or NaN, which it rejects.
+        """
+        # Decode about a chunk at a time, not just what is left of the last one
+        if len(self.buf) - self.pos < self.chunk_size:
+            self.fill()
+        text = self.buf[self.pos:]
+        data = text.encode("utf-8", "surrogatepass")
+        if _LONG_DIGITS in data.translate(_DIGIT_TABLE):
+            return None
+        end = len(data)
+        for _ in range(BATCH_ATTEMPTS):
+            end = max(data.rfind(b"}", 0, end), data.rfind(b"]", 0, end))
+            if end < 0:
+                return None
+            try:
+                elements = loads(b"[" + data[:end + 1] + b"]")
+            except ValueError:
+                continue
+            # Byte and character offsets only differ if the text is not ASCII
+            self.pos += end + 1 if len(data) == len(text) else len(data[:end + 1].decode("utf-8", "surrogatepass"))
+            return elements
+        return None
+
+    def skip_value(self):
+        """Skip one JSON value without building it."""
+        if self.peek() not in "[{":
+            self.decode()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("Unexpected end of JSON input.")
+                continue
+            char = match.group()
+            self.pos = match.end()
+            if char == '"':
+                self._skip_string_body()
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _skip_string_body(self):
+        while True:
+            match = _STRING_SPECIAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("Unterminated string in JSON input.")
+                continue
+            if match.group() == '"':
+                self.pos = match.end()
+                return
+            # Backslash escape: make sure the escaped character is buffered, then skip both
+            self.pos = match.start()
+            if self.pos + 1 >= len(self.buf) and not self.fill():
+                raise ValueError("Unterminated string in JSON input.")
+            self.pos += 2
+
+
+def iter_members(reader: JSONStreamReader) -> Iterator[str]:
+    """Yield the keys of the JSON object at the reader's position.
+
+    After each key the reader sits on the member's value. A consumer may decode
+    or walk that value; if it does not, the value is skipped before the next key.
+    """
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+
+    while True:
+        name = reader.decode()
+        if not isinstance(name, str):
+            raise ValueError("Expected an object key in JSON input.")
+        reader.expect(":")
+        yield name
+        # A value never starts with ',' or '}', so either of them means it was consumed
+        if reader.peek() not in ",}":
+            reader.skip_value()
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' but found {separator!r} in JSON input.")
+
+
+def iter_elements(reader: JSONStreamReader) -> Iterator[Any]:
+    """Decode and yield the elements of the JSON array at the reader's position, one at a time.
+
+    With a JSON backend other than the standard library, the elements in the
+    buffer are decoded in batches. Whatever the backend rejects is decoded
+    by the standard library instead, so the elements (and any error) are the
+    same with every backend.
+    """
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+
+    loads = jsonbackend.fast_loads()
+    slow = 0  # Elements left to the standard library after decode_batch gave up
+    while True:
+        if loads is None or slow:
+            yield reader.decode()
+            slow = max(0, slow - 1)
+        else:
+            elements = reader.decode_batch(loads)
+            if elements is None:
+                slow = SLOW_ELEMENTS
+                continue
+            yield from elements
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' but found {separator!r} in JSON input.")
+
+
+def iter_array(f: TextIO, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of the top-level array stored under key, one at a time.
+
+    Other top-level values are skipped without being decoded. Yields nothing if
+    the key is absent, matching data.get(key, []) on a fully loaded document.
+    """
+    reader = JSONStreamReader(f, chunk_size)
+    for name in iter_members(reader):
+        if name == key and reader.peek() == "[":
+            yield from iter_elements(reader)
+            return
@@ -0,0 +1,226 @@
+import math
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from typing import List, Dict, Optional
+
+from track import EPOCH, LocationTrack, to_epoch_ms
+
+LINEAR = "linear"
+GREAT_CIRCLE = "great-circle"
+INTERPOLATIONS = (LINEAR, GREAT_CIRCLE)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batched lookups fall back to bisect
+    np = None
+
+
+class LocationIndex:
+    """Nearest-timestamp lookups over a time-sorted LocationTrack."""
+
+    def __init__(self, track):
+        """Build the index from the sorted output of parse_location_files."""
+        if not isinstance(track, LocationTrack):
+            track = LocationTrack.from_locations(track)
+        self.track = track
+        self.epochs = track.timestamps
+
+    def __len__(self):
+        return len(self.track)
+
+    def _nearest_position(self, epoch: int, i: int) -> int:
+        """Pick the closer neighbour of insertion point i, preferring the earlier point on ties."""
+        epochs = self.epochs
+        if i >= len(epochs):
+            i = len(epochs) - 1
+        elif i > 0 and epoch - epochs[i - 1] <= epochs[i] - epoch:
+            i -= 1
+        # A linear scan keeps the first of several points sharing a timestamp
+        return bisect_left(epochs, epochs[i], 0, i + 1)
+
+    def nearest(self, photo_time) -> Optional[Dict]:
+        """Return the location closest in time to photo_time, or None if the index is empty."""
+        if not self.epochs:
+            return None
+        epoch = to_epoch_ms(photo_time)
+        return self.track.point(self._nearest_position(epoch, bisect_left(self.epochs, epoch)))
+
+    def nearest_many(self, photo_times) -> List[Optional[Dict]]:
+        """Match a batch of photo timestamps at once; None entries stay None."""
+        results = [None] * len(photo_times)
+        if not self.epochs:
+            return results
+
+        positions = [i for i, t in enumerate(photo_times) if t is not None]
+        epochs = [to_epoch_ms(photo_times[i]) for i in positions]
+        if np is None:
+            for pos, epoch in zip(positions, epochs):
+                results[pos] = self.track.point(self._nearest_position(epoch, bisect_left(self.epochs, epoch)))
+            return results
+
+        # frombuffer shares the track's arrays without copying them
+        track_epochs = np.frombuffer(self.epochs, dtype=np.int64)
+        photo_epochs = np.asarray(epochs, dtype=np.int64)
+        after = np.searchsorted(track_epochs, photo_epochs, side="left")
+        before = np.maximum(after - 1, 0)
+        after = np.minimum(after, len(track_epochs) - 1)
+        # The earlier neighbour wins ties, and when the photo is past the end of the track
+        earlier = (photo_epochs - track_epochs[before] <= track_epochs[after] - photo_epochs) | (photo_epochs > track_epochs[after])
+        nearest = np.where(earlier, before, after)
+        # The first of several points sharing a timestamp
+        repeated = track_epochs[nearest] == track_epochs[np.maximum(nearest - 1, 0)]
+        repeated &= nearest > 0
+        if repeated.any():
+            nearest[repeated] = np.searchsorted(track_epochs, track_epochs[nearest[repeated]], side="left")
+
+        latitudes = (np.frombuffer(self.track.latitudes, dtype=np.int32)[nearest] / 1e7).tolist()
+        longitudes = (np.frombuffer(self.track.longitudes, dtype=np.int32)[nearest] / 1e7).tolist()
+        # timedelta64 converts to timedelta objects far faster than from_epoch_ms builds them one by one
+        offsets = track_epochs[nearest].astype("timedelta64[ms]").tolist()
+        for pos, latitude, longitude, offset in zip(positions, latitudes, longitudes, offsets):
+            results[pos] = {"latitude": latitude, "longitude": longitude, "timestamp": EPOCH + offset}
+        return results
+
+    def match(self, photo_time) -> Optional[Dict]:
+        """Return the location to tag a photo taken at photo_time with."""
+        return self.nearest(photo_time)
+
+    def match_many(self, photo_times) -> List[Optional[Dict]]:
+        """Batched match(); None entries stay None."""
+        return self.nearest_many(photo_times)
+
+
+def _slerp(lat0, lng0, lat1, lng1, w):
+    """Interpolate along the great circle between two points given in degrees."""
+    phi0, lam0, phi1, lam1 = map(math.radians, (lat0, lng0, lat1, lng1))
+    p0 = (math.cos(phi0) * math.cos(lam0), math.cos(phi0) * math.sin(lam0), math.sin(phi0))
+    p1 = (math.cos(phi1) * math.cos(lam1), math.cos(phi1) * math.sin(lam1), math.sin(phi1))
+    omega = math.acos(max(-1.0, min(1.0, sum(a * b for a, b in zip(p0, p1)))))
+    if omega < 1e-12:
+        return lat0 + (lat1 - lat0) * w, lng0 + (lng1 - lng0) * w
+    a, b = math.sin((1 - w) * omega) / math.sin(omega), math.sin(w * omega) / math.sin(omega)
+    x, y, z = (a * c0 + b * c1 for c0, c1 in zip(p0, p1))
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+def _lerp(lat0, lng0, lat1, lng1, w):
+    """Interpolate latitude and longitude linearly, taking the short way across the antimeridian."""
+    dlng = lng1 - lng0
+    if dlng > 180:
+        dlng -= 360
+    elif dlng < -180:
+        dlng += 360
+    lng = lng0 + dlng * w
+    if lng > 180:
+        lng -= 360
+    elif lng < -180:
+        lng += 360
+    return lat0 + (lat1 - lat0) * w, lng
+
+
+class InterpolatingIndex(LocationIndex):
+    """Matches photos to a position interpolated in time between the two bracketing track points.
+
+    If the bracketing points are more than max_gap apart, or the photo lies
+    more than max_gap beyond either end of the track, no location is returned.
+    """
+
+    def __init__(self, track, method: str = LINEAR, max_gap: Optional[timedelta] = None):
+        super().__init__(track)
+        if method not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation method: {method}")
+        self.method = method
+        self.max_gap_ms = max_gap // timedelta(milliseconds=1) if max_gap is not None else None
+
+    def _interpolate(self, photo_time, epoch: int, i: int) -> Optional[Dict]:
+        """Locate photo_time given i, the number of points at or before it."""
+        epochs, track = self.epochs, self.track
+        if i > 0 and epochs[i - 1] == epoch:
+            location = track.point(i - 1)
+        elif i == 0 or i == len(epochs):
+            # Outside the track: hold the end point, within the gap tolerance
+            j = 0 if i == 0 else i - 1
+            if self.max_gap_ms is not None and abs(epoch - epochs[j]) > self.max_gap_ms:
+                return None
+            location = track.point(j)
+        else:
+            t0, t1 = epochs[i - 1], epochs[i]
+            if self.max_gap_ms is not None and t1 - t0 > self.max_gap_ms:
+                return None
+            w = (epoch - t0) / (t1 - t0)
+            interpolate = _slerp if self.method == GREAT_CIRCLE else _lerp
+            lat, lng = interpolate(
+                track.latitudes[i - 1] / 1e7, track.longitudes[i - 1] / 1e7,
+                track.latitudes[i] / 1e7, track.longitudes[i] / 1e7, w,
+            )
+            location = {"latitude": lat, "longitude": lng}
+        location["timestamp"] = photo_time
+        return location
+
+    def match(self, photo_time) -> Optional[Dict]:
+        if not self.epochs:
+            return None
+        epoch = to_epoch_ms(photo_time)
+        return self._interpolate(photo_time, epoch, bisect_right(self.epochs, epoch))
+
+    def match_many(self, photo_times) -> List[Optional[Dict]]:
+        """Interpolate a batch of photo timestamps at once, vectorised with NumPy when available."""
+        results = [None] * len(photo_times)
+        if not self.epochs:
+            return results
+
+        positions = [i for i, t in enumerate(photo_times) if t is not None]
+        epochs = [to_epoch_ms(photo_times[i]) for i in positions]
+        if np is None:
+            for pos, epoch in zip(positions, epochs):
+                results[pos] = self._interpolate(photo_times[pos], epoch, bisect_right(self.epochs, epoch))
+            return results
+
+        track_epochs = np.frombuffer(self.epochs, dtype=np.int64)
+        photo_epochs = np.asarray(epochs, dtype=np.int64)
+        after = np.searchsorted(track_epochs, photo_epochs, side="right")
+        inside = (after > 0) & (after < len(track_epochs))
+        inside &= track_epochs[np.maximum(after - 1, 0)] != photo_epochs
+
+        # Interior photos in one vectorised pass; exact hits and track ends go through _interpolate
+        lo, hi = after[inside] - 1, after[inside]
+        t0, t1 = track_epochs[lo], track_epochs[hi]
+        lats = np.frombuffer(self.track.latitudes, dtype=np.int32) / 1e7
+        lngs = np.frombuffer(self.track.longitudes, dtype=np.int32) / 1e7
+        lat, lng = self._interpolate_arrays(lats[lo], lngs[lo], lats[hi], lngs[hi], (photo_epochs[inside] - t0) / (t1 - t0))
+        too_far = (t1 - t0 > self.max_gap_ms) if self.max_gap_ms is not None else np.zeros(len(lo), dtype=bool)
+
+        interior = iter(zip(lat.tolist(), lng.tolist(), too_far.tolist()))
+        for pos, epoch, i, is_inside in zip(positions, epochs, after.tolist(), inside.tolist()):
+            if is_inside:
+                la, ln, skip = next(interior)
+                results[pos] = None if skip else {"latitude": la, "longitude": ln, "timestamp": photo_times[pos]}
+            else:
+                results[pos] = self._interpolate(photo_times[pos], epoch, i)
+        return results
+
+    def _interpolate_arrays(self, lat0, lng0, lat1, lng1, w):
+        if self.method == GREAT_CIRCLE:
+            phi0, lam0, phi1, lam1 = (np.radians(a) for a in (lat0, lng0, lat1, lng1))
+            p0 = np.stack([np.cos(phi0) * np.cos(lam0), np.cos(phi0) * np.sin(lam0), np.sin(phi0)])
+            p1 = np.stack([np.cos(phi1) * np.cos(lam1), np.cos(phi1) * np.sin(lam1), np.sin(phi1)])
+            omega = np.arccos(np.clip((p0 * p1).sum(axis=0), -1.0, 1.0))
+            small = omega < 1e-12
+            sin_omega = np.where(small, 1.0, np.sin(omega))
+            a = np.where(small, 1 - w, np.sin((1 - w) * omega) / sin_omega)
+            b = np.where(small, w, np.sin(w * omega) / sin_omega)
+            x, y, z = a * p0 + b * p1
+            return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+        dlng = lng1 - lng0
+        dlng = np.where(dlng > 180, dlng - 360, np.where(dlng < -180, dlng + 360, dlng))
+        lng = lng0 + dlng * w
+        lng = np.where(lng > 180, lng - 360, np.where(lng < -180, lng + 360, lng))
+        return lat0 + (lat1 - lat0) * w, lng
+
+
+def make_index(track, interpolation: Optional[str] = None, max_gap: Optional[timedelta] = None) -> LocationIndex:
+    """Build the matcher for a track: nearest point by default, or an InterpolatingIndex."""
+    if interpolation is None:
+        return LocationIndex(track)
+    return InterpolatingIndex(track, interpolation, max_gap)
@@ -0,0 +1,407 @@
+import mmap
+import re
+from datetime import datetime, timezone
+from functools import reduce
+from operator import xor
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from track import LocationTrack, to_epoch_ms
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # NumPy is optional; sentences are then decoded one at a time
+    np = None
+
+# A GGA or RMC sentence from any talker (GP, GN, GL, GA, ...): body and checksum
+SENTENCE = re.compile(rb"\$([A-Z]{2}(GGA|RMC),[^*\r\n$]*)\*([0-9A-Fa-f]{2})")
+TIME_FIELD = re.compile(rb"\d{6}(?:\.\d+)?")
+COORDINATE_FIELD = re.compile(rb"\d+(?:\.\d*)?")
+DATE_FIELD = re.compile(rb"\d{6}")
+# Longer numeric fields are treated as invalid
+MAX_FIELD = 32
+CHUNK_SIZE = 1 << 23
+DAY_MS = 24 * 3600 * 1000
+HALF_DAY_MS = DAY_MS // 2
+
+# Fields after the sentence type: time, lat, N/S, lng, E/W, then GGA fix quality or RMC date
+GGA_FIELDS = (1, 2, 3, 4, 5)
+RMC_FIELDS = (1, 3, 4, 5, 6)
+GGA_QUALITY, RMC_STATUS, RMC_DATE = 6, 2, 9
+# Largest valid latitude and longitude in E7 degrees
+MAX_LAT_E7, MAX_LNG_E7 = 900000000, 1800000000
+
+# Numbers with more significant digits than this are converted by float() rather than from their digits
+MAX_EXACT_DIGITS = 15
+
+if np is not None:
+    HEX_VALUES = np.zeros(256, dtype=np.uint8)
+    IS_HEX = np.zeros(256, dtype=bool)
+    for _digit in b"0123456789abcdefABCDEF":
+        HEX_VALUES[_digit], IS_HEX[_digit] = int(chr(_digit), 16), True
+    # Masks of the bytes of a little-endian 64-bit word before byte k, and after byte k
+    LOW_BYTES = np.array([(1 << 8 * k) - 1 for k in range(8)], dtype=np.uint64)
+    HIGH_BYTES = np.array([~((1 << 8 * (k + 1)) - 1) & (1 << 64) - 1 for k in range(8)], dtype=np.uint64)
+    FLOAT_POWERS_OF_TEN = 10.0 ** np.arange(MAX_FIELD + 1)
+
+
+def _time_of_day_ms(field: bytes) -> int:
+    """Convert an NMEA hhmmss[.sss] field to milliseconds since midnight."""
+    return int(field[:2]) * 3600000 + int(field[2:4]) * 60000 + round(float(field[4:]) * 1000)
+
+
+def _coordinate_e7(field: bytes, hemisphere: bytes) -> int:
+    """Convert an NMEA [d]ddmm.mmmm field and its hemisphere to E7 degrees."""
+    value = float(field)
+    degrees = value // 100
+    e7 = round((degrees + (value - degrees * 100) / 60) * 1e7)
+    return -e7 if hemisphere in (b"S", b"W") else e7
+
+
+def _is_coordinate(field: bytes) -> bool:
+    return len(field) <= MAX_FIELD and COORDINATE_FIELD.fullmatch(field) is not None
+
+
+class _Fields:
+    """The comma-separated fields of many sentences in one buffer, gathered column by column."""
+
+    def __init__(self, padded, size, starts, stars):
+        self.stars = stars
+        # Every field is copied out as one row of a window over the buffer, which is padded for the last ones
+        self.windows = sliding_window_view(padded, MAX_FIELD)
+        self.commas = np.flatnonzero(padded[:size] == ord(","))
+        self.first = np.searchsorted(self.commas, starts)
+        self.count = np.searchsorted(self.commas, stars) - self.first  # Fields after the type
+
+    def select(self, rows):
+        self.stars, self.first, self.count = self.stars[rows], self.first[rows], self.count[rows]
+
+    def get(self, k, min_width: int = 1):
+        """Return field k of every sentence as a uint8 matrix, with the field lengths.
+
+        Columns past a field's length hold whatever follows it in the buffer.
+        """
+        last = len(self.commas) - 1
+        start = self.commas[np.minimum(self.first + k - 1, last)] + 1
+        end = np.where(k < self.count, self.commas[np.minimum(self.first + k, last)], self.stars)
+        lengths = end - start
+        width = max(min_width, min(int(lengths.max(initial=0)), MAX_FIELD))
+        return self.windows[start, :width], lengths
+
+
+def _digits(chars):
+    return (chars >= ord("0")) & (chars <= ord("9"))
+
+
+def _decimals(chars, lengths):
+    """Vectorised float() of decimal fields, one column at a time.
+
+    Returns the values, which fields are wellformed (a digit, then digits
+    with at most one dot) and how many digits each has; values of the other
+    fields are meaningless. Up to MAX_EXACT_DIGITS digits, the digits form an
+    integer that is exact in a float64, and dividing it by the power of ten
+    of the decimal places rounds exactly as parsing the text does.
+    """
+    mantissa = np.zeros(len(chars), dtype=np.int64)
+    count = np.zeros(len(chars), dtype=np.int64)
+    dots = np.zeros(len(chars), dtype=np.int64)
+    places = np.zeros(len(chars), dtype=np.int64)
+    wellformed = (lengths >= 1) & (lengths <= MAX_FIELD) & _digits(chars[:, 0])
+    for column in range(chars.shape[1]):
+        inside = column < lengths
+        digit = inside & _digits(chars[:, column])
+        dot = inside & (chars[:, column] == ord("."))
+        wellformed &= digit | dot | ~inside
+        mantissa = np.where(digit, mantissa * 10 + chars[:, column] - ord("0"), mantissa)
+        count += digit
+        dots += dot
+        places = np.where(dot, lengths - 1 - column, places)
+    wellformed &= dots <= 1
+    values = mantissa / FLOAT_POWERS_OF_TEN[np.minimum(places, MAX_FIELD)]
+    long = wellformed & (count > MAX_EXACT_DIGITS)
+    if long.any():
+        rows = np.where(np.arange(chars.shape[1]) < lengths[long, None], chars[long], 0).astype(np.uint8)
+        values[long] = rows.view(f"S{rows.shape[1]}").ravel().astype(np.float64)
+    return values, wellformed, count
+
+
+def _parse_coordinates(chars, lengths, hemispheres, hemisphere_lengths, positive: bytes, negative: bytes, limit: int):
+    """Vectorised _coordinate_e7; returns the E7 values and which fields were usable."""
+    values, usable, _ = _decimals(chars, lengths)
+    hemisphere = hemispheres[:, 0]
+    south = hemisphere == negative[0]
+    usable &= (hemisphere_lengths == 1) & ((hemisphere == positive[0]) | south)
+
+    degrees = np.floor_divide(values, 100)
+    e7 = np.round((degrees + (values - degrees * 100) / 60) * 1e7)
+    # Out of range before the cast, which would wrap values too large for int64
+    usable &= e7 <= limit
+    e7 = np.where(usable, e7, 0).astype(np.int64)
+    return np.where(south, -e7, e7), usable
+
+
+class NMEAScanner:
+    """Decode fixes from GGA and RMC sentences into columnar tracks.
+
+    GGA sentences carry no date, so each fix takes the date of the last RMC
+    sentence that had one, plus a day if its time of day is more than 12
+    hours before that sentence's (the log crossed midnight). Fixes before the
+    first dated RMC are dated the same way from it, looking forwards.
+    Sentences with bad checksums or malformed fields, invalid fixes and a fix
+    repeating the previous fix's timestamp (a GGA/RMC pair) are dropped.
+
+    With NumPy, each chunk is tokenized and decoded in a few vectorised passes
+    over the buffer; without it, sentence by sentence with the same results.
+    """
+
+    def __init__(self):
+        self.anchor = None  # (midnight epoch ms, time of day) of the last dated RMC
+        self.pending = []  # (time of day, lat, lng) of fixes seen before any date
+        self.last_ts = None
+        self.bad_checksums = 0
+        self.malformed = 0
+        self._days = {}
+
+    def _day(self, field: bytes) -> Optional[int]:
+        """Return epoch ms of midnight of an NMEA ddmmyy date, or None if it is not a date."""
+        if field not in self._days:
+            year = int(field[4:6])
+            year += 2000 if year < 80 else 1900
+            try:
+                self._days[field] = to_epoch_ms(datetime(year, int(field[2:4]), int(field[:2]), tzinfo=timezone.utc))
+            except ValueError:
+                self._days[field] = None
+        return self._days[field]
+
+    def _append(self, track: LocationTrack, ts: int, lat: int, lng: int):
+        if ts != self.last_ts:
+            track.append(ts, lat, lng)
+            self.last_ts = ts
+
+    def feed(self, chunk: bytes) -> LocationTrack:
+        """Decode the complete sentences in chunk."""
+        if np is not None:
+            return self._feed_arrays(chunk)
+        return self._feed_loop(chunk)
+
+    def _feed_loop(self, chunk: bytes) -> LocationTrack:
+        track = LocationTrack()
+        for body, kind, checksum in SENTENCE.findall(chunk):
+            if reduce(xor, body, 0) != int(checksum, 16):
+                self.bad_checksums += 1
+                continue
+            fields = body.split(b",")
+            gga = kind == b"GGA"
+            if len(fields) <= (GGA_QUALITY if gga else RMC_DATE) or not (
+                len(fields[1]) <= MAX_FIELD and TIME_FIELD.fullmatch(fields[1])
+            ):
+                self.malformed += 1
+                continue
+
+            time, lat, ns, lng, ew = (fields[k] for k in (GGA_FIELDS if gga else RMC_FIELDS))
+            tod = _time_of_day_ms(time)
+            if gga:
+                valid = b"1" <= fields[GGA_QUALITY][:1] <= b"9"
+            else:
+                valid = fields[RMC_STATUS] == b"A"
+                date = fields[RMC_DATE]
+                day = self._day(date) if DATE_FIELD.fullmatch(date) else None
+                if day is not None:
+                    for pending_tod, pending_lat, pending_lng in self.pending:
+                        pending_day = day - DAY_MS if pending_tod > tod + HALF_DAY_MS else day
+                        self._append(track, pending_day + pending_tod, pending_lat, pending_lng)
+                    self.pending = []
+                    self.anchor = (day, tod)
+            if not (valid and _is_coordinate(lat) and ns in (b"N", b"S") and _is_coordinate(lng) and ew in (b"E", b"W")):
+                continue
+
+            lat_e7, lng_e7 = _coordinate_e7(lat, ns), _coordinate_e7(lng, ew)
+            if abs(lat_e7) > MAX_LAT_E7 or abs(lng_e7) > MAX_LNG_E7:
+                continue
+            if self.anchor is None:
+                self.pending.append((tod, lat_e7, lng_e7))
+            else:
+                day, anchor_tod = self.anchor
+                self._append(track, day + (DAY_MS if tod < anchor_tod - HALF_DAY_MS else 0) + tod, lat_e7, lng_e7)
+        return track
+
+    def _feed_arrays(self, chunk: bytes) -> LocationTrack:
+        size = len(chunk)
+        # Pad to whole 64-bit words, with room for a field window past the end
+        padded = np.frombuffer(bytes(chunk) + bytes(MAX_FIELD + 8 - size % 8), dtype=np.uint8)
+        buffer = padded[:size]
+
+        # Candidate sentences: "$", two capital letters, GGA or RMC and a comma
+        starts = np.flatnonzero(buffer == ord("$"))
+        starts = starts[starts + 10 <= size]
+        head = buffer[starts[:, None] + np.arange(1, 7)]
+        gga = (head[:, 2] == ord("G")) & (head[:, 3] == ord("G")) & (head[:, 4] == ord("A"))
+        rmc = (head[:, 2] == ord("R")) & (head[:, 3] == ord("M")) & (head[:, 4] == ord("C"))
+        talker = (head[:, :2] >= ord("A")) & (head[:, :2] <= ord("Z"))
+        keep = talker[:, 0] & talker[:, 1] & (gga | rmc) & (head[:, 5] == ord(","))
+        starts, gga = starts[keep], gga[keep]
+
+        # Each ends at the first "*" with no line break or "$" before it, followed by two hex digits
+        stars = np.append(np.flatnonzero(buffer == ord("*")), size)
+        stars = stars[np.searchsorted(stars, starts)]
+        breaks = np.append(np.flatnonzero((buffer == ord("\n")) | (buffer == ord("\r")) | (buffer == ord("$"))), size)
+        keep = (stars < breaks[np.searchsorted(breaks, starts, side="right")]) & (stars + 2 < size)
+        starts, stars, gga = starts[keep], stars[keep], gga[keep]
+        digits = buffer[stars[:, None] + np.array([1, 2])]
+        keep = IS_HEX[digits[:, 0]] & IS_HEX[digits[:, 1]]
+        starts, stars, gga, digits = starts[keep], stars[keep], gga[keep], digits[keep]
+
+        # XOR of the bytes between "$" and "*": the prefix XORs of the 64-bit words they span,
+        # less the bytes of the end words outside the sentence, folded into one byte
+        words = padded.view("<u8")
+        prefix = np.bitwise_xor.accumulate(words)
+        first, last = starts + 1, stars - 1
+        first_word, last_word = first // 8, last // 8
+        checksum = prefix[last_word] ^ prefix[first_word] ^ words[first_word]
+        checksum ^= words[first_word] & LOW_BYTES[first % 8]
+        checksum ^= words[last_word] & HIGH_BYTES[last % 8]
+        for shift in (32, 16, 8):
+            checksum ^= checksum >> np.uint64(shift)
+        ok = (checksum & np.uint64(0xFF)) == HEX_VALUES[digits[:, 0]] * 16 + HEX_VALUES[digits[:, 1]]
+        self.bad_checksums += int(len(ok) - np.count_nonzero(ok))
+        starts, stars, gga = starts[ok], stars[ok], gga[ok]
+
+        fields = _Fields(padded, size, starts, stars)
+        time, time_lengths = fields.get(1, min_width=8)
+        # hhmmss, or hhmmss. and more digits
+        _, wellformed, digit_count = _decimals(time, time_lengths)
+        wellformed &= fields.count >= np.where(gga, GGA_QUALITY, RMC_DATE)
+        wellformed &= ((time_lengths == 6) & (digit_count == 6)) | (
+            (time_lengths >= 8) & (digit_count == time_lengths - 1) & (time[:, 6] == ord("."))
+        )
+        self.malformed += int(len(wellformed) - np.count_nonzero(wellformed))
+        fields.select(wellformed)
+        gga, time = gga[wellformed], time[wellformed]
+
+        seconds = _decimals(time[:, 4:], time_lengths[wellformed] - 4)[0]
+        hm = time[:, :4].astype(np.int64) - ord("0")
+        tod = hm[:, 0] * 36000000 + hm[:, 1] * 3600000 + hm[:, 2] * 600000 + hm[:, 3] * 60000
+        tod += np.round(seconds * 1000).astype(np.int64)
+
+        lat, lat_usable = _parse_coordinates(*fields.get(np.where(gga, 2, 3)), *fields.get(np.where(gga, 3, 4)), b"N", b"S", MAX_LAT_E7)
+        lng, lng_usable = _parse_coordinates(*fields.get(np.where(gga, 4, 5)), *fields.get(np.where(gga, 5, 6)), b"E", b"W", MAX_LNG_E7)
+        flag, flag_lengths = fields.get(np.where(gga, GGA_QUALITY, RMC_STATUS))
+        valid = lat_usable & lng_usable & (flag_lengths >= 1) & np.where(
+            gga, (flag[:, 0] >= ord("1")) & (flag[:, 0] <= ord("9")), (flag_lengths == 1) & (flag[:, 0] == ord("A"))
+        )
+
+        # Date every sentence from the last dated RMC at or before it
+        date, date_lengths = fields.get(RMC_DATE, min_width=6)
+        anchors = ~gga & (date_lengths == 6) & np.all(_digits(date[:, :6]), axis=1)
+        dates, inverse = np.unique(np.ascontiguousarray(date[anchors, :6]).view("S6").ravel(), return_inverse=True)
+        days = [self._day(bytes(d)) for d in dates]
+        real = np.array([day is not None for day in days], dtype=bool)[inverse]
+        anchor_day = np.array([day or 0 for day in days], dtype=np.int64)[inverse][real]
+        anchors[np.flatnonzero(anchors)[~real]] = False
+        anchor_tod = tod[anchors]
+        if self.anchor is not None:
+            anchor_day = np.concatenate(([self.anchor[0]], anchor_day))
+            anchor_tod = np.concatenate(([self.anchor[1]], anchor_tod))
+            ordinal = np.cumsum(anchors)
+        else:
+            ordinal = np.cumsum(anchors) - 1
+        dated = ordinal >= 0
+        rows = np.flatnonzero(valid & dated)
+        base_day, base_tod = anchor_day[ordinal[rows]], anchor_tod[ordinal[rows]]
+        timestamps = base_day + np.where(tod[rows] < base_tod - HALF_DAY_MS, DAY_MS, 0) + tod[rows]
+        lats, lngs = lat[rows], lng[rows]
+
+        # Fixes before the first date: this chunk's, after any held back from earlier chunks
+        undated = np.flatnonzero(valid & ~dated)
+        pending = self.pending + list(zip(tod[undated].tolist(), lat[undated].tolist(), lng[undated].tolist()))
+        self.pending = []
+        if len(anchor_tod):
+            if pending:
+                first_day, first_tod = anchor_day[0], anchor_tod[0]
+                pending_tod, pending_lat, pending_lng = (np.array(column, dtype=np.int64) for column in zip(*pending))
+                pending_ts = first_day - np.where(pending_tod > first_tod + HALF_DAY_MS, DAY_MS, 0) + pending_tod
+                timestamps = np.concatenate((pending_ts, timestamps))
+                lats, lngs = np.concatenate((pending_lat, lats)), np.concatenate((pending_lng, lngs))
+            self.anchor = (int(anchor_day[-1]), int(anchor_tod[-1]))
+        else:
+            self.pending = pending
+
+        track = LocationTrack()
+        if len(timestamps):
+            keep = np.empty(len(timestamps), dtype=bool)
+            keep[0] = timestamps[0] != self.last_ts
+            keep[1:] = timestamps[1:] != timestamps[:-1]
+            self.last_ts = int(timestamps[-1])
+            track.timestamps.frombytes(timestamps[keep].astype(np.int64).tobytes())
+            track.latitudes.frombytes(lats[keep].astype(np.int32).tobytes())
+            track.longitudes.frombytes(lngs[keep].astype(np.int32).tobytes())
+        return track
+
+    def finish(self) -> LocationTrack:
+        """Emit fixes still waiting for a date, assuming today's UTC date if no RMC ever gave one."""
+        track = LocationTrack()
+        if self.pending:
+            print("No RMC sentence with a date found; assuming today's date for the NMEA fixes.")
+            today = to_epoch_ms(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0))
+            first_tod = self.pending[0][0]
+            for tod, lat, lng in self.pending:
+                self._append(track, today + (DAY_MS if tod < first_tod - HALF_DAY_MS else 0) + tod, lat, lng)
+            self.pending = []
+        return track
+
+
+def iter_chunks(buffer, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Split buffer into chunks of about chunk_size that end on line boundaries."""
+    size, pos = len(buffer), 0
+    while pos < size:
+        end = min(pos + chunk_size, size)
+        if end < size:
+            newline = buffer.rfind(b"\n", pos, end)
+            end = newline + 1 if newline >= 0 else end
+        yield buffer[pos:end]
+        pos = end
+
+
+def iter_stream_chunks(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a binary stream in chunks of about chunk_size that end on line boundaries."""
+    rest = b""
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        newline = data.rfind(b"\n")
+        if newline < 0:
+            rest = data
+            continue
+        rest = data[newline + 1:]
+        yield data[:newline + 1]
+    if rest:
+        yield rest
+
+
+def scan_file(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[LocationTrack]:
+    """Memory-map an NMEA log and yield its fixes one chunk at a time."""
+    with open(file_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from _scan(iter_chunks(buffer, chunk_size), file_path)
+
+
+def scan_stream(f: BinaryIO, file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[LocationTrack]:
+    """Yield the fixes of an NMEA log read from a binary stream, such as a decompressing one."""
+    yield from _scan(iter_stream_chunks(f, chunk_size), file_path)
+
+
+def _scan(chunks: Iterable[bytes], file_path: str) -> Iterator[LocationTrack]:
+    scanner = NMEAScanner()
+    for chunk in chunks:
+        track = scanner.feed(chunk)
+        if track:
+            yield track
+    track = scanner.finish()
+    if track:
+        yield track
+    if scanner.bad_checksums or scanner.malformed:
+        print(f"Skipped {scanner.bad_checksums} NMEA sentences with bad checksums and {scanner.malformed} malformed ones in {file_path}.")
@@ -1,226 +1,415 @@
-import json
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import archives
+import nmea
+from jsonstream import JSONStreamReader, iter_array, iter_elements, iter_members
+from timestamps import iso_to_epoch_ms, iso_to_epoch_ms_many
+from track import LocationTrack, merge_tracks, to_e7, to_epoch_ms
+
+# Number of points handed out per batch by the streaming parsers
+BATCH_SIZE = 100_000
+
+
+def _batched(elements: Iterable[Dict], add: Callable[[Dict, LocationTrack], None], batch_size: int,
+             window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+    """Feed JSON elements through add() and yield the resulting points in bounded batches.
+
+    window is an optional (start, end) pair of epoch milliseconds; points
+    outside it are dropped before a batch is handed out.
+    """
+    batch = LocationTrack()
+    for element in elements:
+        add(element, batch)
+        if len(batch) >= batch_size:
+            if window is not None:
+                batch = batch.select(*window)
+            if batch:
+                yield batch
+            batch = LocationTrack()
+    if window is not None:
+        batch = batch.select(*window)
+    if batch:
+        yield batch
 
 
 class JSONLocationParser:
     """Parser for new JSON format with latitudeE7 and longitudeE7 fields."""
 
+    ROOT_KEY = "locations"
+
     @staticmethod
-    def parse(file_path: str) -> List[Dict]:
+    def parse(file_path: str) -> LocationTrack:
         """Parse the JSON file and return unified location data."""
-        locations = []
+        locations = LocationTrack()
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            for entry in data.get("locations", []):
-                try:
-                    timestamp = datetime.fromtimestamp(float(entry["timestampMs"]) / 1000)
-                    longitude = float(entry["longitudeE7"]) / 1e7
-                    latitude = float(entry["latitudeE7"]) / 1e7
-
-                    locations.append({
-                        "latitude": latitude,
-                        "longitude": longitude,
-                        "timestamp": timestamp,
-                    })
-                except KeyError as e:
-                    print(f"Skipping entry due to missing key: {e}")
-
+            for batch in JSONLocationParser.stream(file_path):
+                locations.extend(batch)
         except Exception as e:
             print(f"Error parsing file {file_path}: {e}")
 
         return locations
 
+    @staticmethod
+    def stream(file_path: str, batch_size: int = BATCH_SIZE, window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+        """Walk the locations array incrementally and yield points in batches."""
+        with archives.open_text(file_path) as f:
+            yield from _batched(iter_array(f, JSONLocationParser.ROOT_KEY), JSONLocationParser.add_element, batch_size, window)
+
+    @staticmethod
+    def add_element(entry: Dict, locations: LocationTrack):
+        """Append the point described by one locations entry."""
+        try:
+            # Newer exports replace timestampMs with an ISO 8601 timestamp
+            if "timestampMs" not in entry and "timestamp" in entry:
+                timestamp_ms = iso_to_epoch_ms(entry["timestamp"])
+            else:
+                timestamp_ms = int(entry["timestampMs"])
+            locations.append(
+                timestamp_ms,
+                int(entry["latitudeE7"]),
+                int(entry["longitudeE7"]),
+            )
+        except KeyError as e:
+            print(f"Skipping entry due to missing key: {e}")
+        except OverflowError as e:
+            print(f"Skipping entry with out-of-range value: {e}")
+        except ValueError as e:
+            print(f"Skipping entry with invalid timestamp: {e}")
+
 
 class OldJSONLocationParser:
     """Parser for old JSON format with semanticSegments."""
 
+    ROOT_KEY = "semanticSegments"
+
     @staticmethod
-    def parse(file_path: str) -> List[Dict]:
+    def parse(file_path: str) -> LocationTrack:
         """Parse the old JSON format and return unified location data."""
-        locations = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        for segment in data.get("semanticSegments", []):
-            if "timelinePath" in segment:
-                for path in segment["timelinePath"]:
-                    try:
-                        # Remove ° symbol before converting to float
-                        latitude, longitude = map(
-                            lambda x: float(x.replace("°", "").strip()), 
-                            path["point"].split(",")
-                        )
-                        timestamp = datetime.strptime(path["time"], "%Y-%m-%dT%H:%M:%S.%f%z")
-                        locations.append({
-                            "latitude": latitude,
-                            "longitude": longitude,
-                            "timestamp": timestamp,
-                        })
-                    except Exception as e:
-                        print(f"Error parsing old JSON entry: {e}")
-
+        locations = LocationTrack()
+        for batch in OldJSONLocationParser.stream(file_path):
+            locations.extend(batch)
         return locations
 
+    @staticmethod
+    def stream(file_path: str, batch_size: int = BATCH_SIZE, window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+        """Walk the semanticSegments array incrementally and yield points in batches."""
+        with archives.open_text(file_path) as f:
+            yield from _batched(iter_array(f, OldJSONLocationParser.ROOT_KEY), OldJSONLocationParser.add_element, batch_size, window)
+
+    @staticmethod
+    def add_element(segment: Dict, locations: LocationTrack):
+        """Append the timelinePath points of one semantic segment."""
+        if "timelinePath" in segment:
+            paths = segment["timelinePath"]
+            try:
+                times = iso_to_epoch_ms_many([path["time"] for path in paths])
+            except Exception:
+                # Convert point by point below, so that only the bad points are reported
+                times = [None] * len(paths)
+            for path, timestamp_ms in zip(paths, times):
+                try:
+                    # Remove ° symbol before converting to float
+                    latitude, longitude = map(
+                        lambda x: float(x.replace("°", "").strip()), 
+                        path["point"].split(",")
+                    )
+                    if timestamp_ms is None:
+                        timestamp_ms = iso_to_epoch_ms(path["time"])
+                    locations.append(timestamp_ms, to_e7(latitude), to_e7(longitude))
+                except Exception as e:
+                    print(f"Error parsing old JSON entry: {e}")
+
 
 class NMEALocationParser:
     """Parser for NMEA location format (e.g., GPS logs)."""
 
     @staticmethod
-    def parse(file_path: str) -> List[Dict]:
-        locations = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.startswith("$GPGGA"):
-                    try:
-                        parts = line.split(",")
-                        latitude = NMEALocationParser.convert_to_decimal(parts[2], parts[3])
-                        longitude = NMEALocationParser.convert_to_decimal(parts[4], parts[5])
-                        timestamp = NMEALocationParser.parse_timestamp(parts[1])
-                        locations.append({
-                            "latitude": latitude,
-                            "longitude": longitude,
-                            "timestamp": timestamp,
-                        })
-                    except Exception as e:
-                        print(f"Error parsing NMEA line: {line.strip()} - {e}")
+    def parse(file_path: str) -> LocationTrack:
+        locations = LocationTrack()
+        for batch in NMEALocationParser.stream(file_path):
+            locations.extend(batch)
         return locations
 
     @staticmethod
-    def convert_to_decimal(coord, direction):
-        """Convert NMEA coordinates to decimal degrees."""
-        if not coord or not direction:
-            raise ValueError("Invalid NMEA coordinate or direction.")
-        degrees = int(float(coord) / 100)
-        minutes = float(coord) - (degrees * 100)
-        decimal = degrees + (minutes / 60)
-        if direction in ["S", "W"]:
-            decimal *= -1
-        return decimal
+    def stream(file_path: str, batch_size: int = BATCH_SIZE, window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+        """Scan the log for GGA and RMC fixes and yield them in batches.
+
+        Plain logs are memory-mapped and compressed ones decompressed as they
+        are read. See nmea.NMEAScanner for how dates and checksums are handled.
+        """
+        if archives.is_compressed(file_path):
+            with archives.open_binary(file_path) as f:
+                yield from NMEALocationParser._batches(nmea.scan_stream(f, file_path), batch_size, window)
+        else:
+            yield from NMEALocationParser._batches(nmea.scan_file(file_path), batch_size, window)
 
     @staticmethod
-    def parse_timestamp(time_str):
-        """Parse NMEA UTC time to datetime."""
-        if not time_str:
-            raise ValueError("Invalid NMEA time string.")
-        hour = int(time_str[:2])
-        minute = int(time_str[2:4])
-        second = int(float(time_str[4:]))
-        return datetime.utcnow().replace(hour=hour, minute=minute, second=second, microsecond=0)
+    def _batches(tracks: Iterable[LocationTrack], batch_size: int, window: Optional[Tuple[int, int]]) -> Iterator[LocationTrack]:
+        for track in tracks:
+            if window is not None:
+                track = track.select(*window)
+            for start in range(0, len(track), batch_size):
+                yield track[start:start + batch_size]
 
 
 class GoogleTimelineParser:
     """Parser for Google Timeline JSON format."""
 
+    ROOT_KEY = "timelineObjects"
+
     @staticmethod
-    def parse(file_path: str) -> List[Dict]:
+    def parse(file_path: str) -> LocationTrack:
         """Parse the Google Timeline JSON format and return unified location data."""
-        locations = []
+        locations = LocationTrack()
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            for obj in data.get("timelineObjects", []):
-                # Handle activitySegment
-                if "activitySegment" in obj:
-                    segment = obj["activitySegment"]
-                    try:
-                        # Check for required keys in activitySegment
-                        if "startLocation" not in segment or "endLocation" not in segment:
-                            print(f"Skipping activitySegment due to missing start or end location: {segment}")
-                            continue
-
-                        start_lat = segment["startLocation"]["latitudeE7"] / 1e7
-                        start_lng = segment["startLocation"]["longitudeE7"] / 1e7
-                        end_lat = segment["endLocation"]["latitudeE7"] / 1e7
-                        end_lng = segment["endLocation"]["longitudeE7"] / 1e7
-                        start_time = datetime.fromisoformat(segment["duration"]["startTimestamp"].replace("Z", "+00:00"))
-                        end_time = datetime.fromisoformat(segment["duration"]["endTimestamp"].replace("Z", "+00:00"))
-
-                        locations.append({
-                            "latitude": start_lat,
-                            "longitude": start_lng,
-                            "timestamp": start_time,
-                        })
-                        locations.append({
-                            "latitude": end_lat,
-                            "longitude": end_lng,
-                            "timestamp": end_time,
-                        })
-                    except KeyError as e:
-                        print(f"Skipping activitySegment due to missing key: {e}")
-
-                # Handle placeVisit
-                if "placeVisit" in obj:
-                    visit = obj["placeVisit"]
-                    try:
-                        # Check for required keys in placeVisit
-                        if "location" not in visit or "latitudeE7" not in visit["location"] or "longitudeE7" not in visit["location"]:
-                            print(f"Skipping placeVisit due to missing location data: {visit}")
-                            continue
-
-                        location = visit["location"]
-                        latitude = location["latitudeE7"] / 1e7
-                        longitude = location["longitudeE7"] / 1e7
-                        start_time = datetime.fromisoformat(visit["duration"]["startTimestamp"].replace("Z", "+00:00"))
-                        end_time = datetime.fromisoformat(visit["duration"]["endTimestamp"].replace("Z", "+00:00"))
-
-                        locations.append({
-                            "latitude": latitude,
-                            "longitude": longitude,
-                            "timestamp": start_time,
-                        })
-                        locations.append({
-                            "latitude": latitude,
-                            "longitude": longitude,
-                            "timestamp": end_time,
-                        })
-                    except KeyError as e:
-                        print(f"Skipping placeVisit due to missing key: {e}")
-
+            for batch in GoogleTimelineParser.stream(file_path):
+                locations.extend(batch)
         except Exception as e:
             print(f"Error parsing Google Timeline JSON: {e}")
 
         return locations
 
+    @staticmethod
+    def stream(file_path: str, batch_size: int = BATCH_SIZE, window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+        """Walk the timelineObjects array incrementally and yield points in batches."""
+        with archives.open_text(file_path) as f:
+            yield from _batched(iter_array(f, GoogleTimelineParser.ROOT_KEY), GoogleTimelineParser.add_element, batch_size, window)
+
+    @staticmethod
+    def add_element(obj: Dict, locations: LocationTrack):
+        """Append the points of one timeline object (activitySegment and/or placeVisit)."""
+        # Handle activitySegment
+        if "activitySegment" in obj:
+            segment = obj["activitySegment"]
+            try:
+                # Check for required keys in activitySegment
+                if "startLocation" not in segment or "endLocation" not in segment:
+                    print(f"Skipping activitySegment due to missing start or end location: {segment}")
+                    return
+
+                start_lat = to_e7(segment["startLocation"]["latitudeE7"] / 1e7)
+                start_lng = to_e7(segment["startLocation"]["longitudeE7"] / 1e7)
+                end_lat = to_e7(segment["endLocation"]["latitudeE7"] / 1e7)
+                end_lng = to_e7(segment["endLocation"]["longitudeE7"] / 1e7)
+                start_ms = iso_to_epoch_ms(segment["duration"]["startTimestamp"])
+                end_ms = iso_to_epoch_ms(segment["duration"]["endTimestamp"])
+
+                locations.append(start_ms, start_lat, start_lng)
+                locations.append(end_ms, end_lat, end_lng)
+            except KeyError as e:
+                print(f"Skipping activitySegment due to missing key: {e}")
+
+        # Handle placeVisit
+        if "placeVisit" in obj:
+            visit = obj["placeVisit"]
+            try:
+                # Check for required keys in placeVisit
+                if "location" not in visit or "latitudeE7" not in visit["location"] or "longitudeE7" not in visit["location"]:
+                    print(f"Skipping placeVisit due to missing location data: {visit}")
+                    return
+
+                location = visit["location"]
+                latitude = to_e7(location["latitudeE7"] / 1e7)
+                longitude = to_e7(location["longitudeE7"] / 1e7)
+                start_ms = iso_to_epoch_ms(visit["duration"]["startTimestamp"])
+                end_ms = iso_to_epoch_ms(visit["duration"]["endTimestamp"])
+
+                locations.append(start_ms, latitude, longitude)
+                locations.append(end_ms, latitude, longitude)
+            except KeyError as e:
+                print(f"Skipping placeVisit due to missing key: {e}")
+
+
+# Top-level keys that identify each JSON export format
+JSON_PARSERS = {
+    GoogleTimelineParser.ROOT_KEY: GoogleTimelineParser,
+    JSONLocationParser.ROOT_KEY: JSONLocationParser,
+    OldJSONLocationParser.ROOT_KEY: OldJSONLocationParser,
+}
+
+NMEA_SENTENCE = re.compile(r"\$[A-Z]{5},")
+
+# Upper bound on how much of a file get_parser reads to recognise it
+SNIFF_SIZE = 64 * 1024
+
 
 class LocationParserFactory:
     """Factory to determine and return the appropriate parser."""
 
     @staticmethod
-    def get_parser(file_path: str):
-        """Determine the correct parser based on file structure."""
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                if "timelineObjects" in data:
-                    return GoogleTimelineParser
-                if "locations" in data:
-                    return JSONLocationParser
-                if "semanticSegments" in data:
-                    return OldJSONLocationParser
-            except json.JSONDecodeError:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    first_line = file.readline()
-                    if first_line.startswith("$GPGGA"):
-                        return NMEALocationParser
+    def _detect(reader: JSONStreamReader) -> Tuple[type, Iterator]:
+        """Recognise the format at the reader's position.
+
+        Returns the parser class and, for JSON formats, an iterator over the
+        elements it should consume, continuing from where detection stopped.
+        NMEA logs are rescanned from the start by NMEALocationParser.stream,
+        so no elements are returned for them.
+        """
+        try:
+            first = reader.peek()
+        except ValueError:
+            raise ValueError("Unknown file format.")
+
+        if first == "{":
+            for name in iter_members(reader):
+                parser_class = JSON_PARSERS.get(name)
+                if parser_class is not None and reader.peek() == "[":
+                    return parser_class, iter_elements(reader)
+        elif NMEA_SENTENCE.match(reader.buf, reader.pos):
+            return NMEALocationParser, iter(())
 
         raise ValueError("Unknown file format.")
 
+    @staticmethod
+    def get_parser(file_path: str):
+        """Determine the correct parser from a bounded prefix of the file."""
+        with archives.open_text(file_path) as f:
+            head = io.StringIO(f.read(SNIFF_SIZE))
+        try:
+            parser_class, _ = LocationParserFactory._detect(JSONStreamReader(head))
+        except ValueError:
+            raise ValueError("Unknown file format.")
+        return parser_class
 
-def parse_location_files(file_paths: List[str]) -> List[Dict]:
-    """Parse multiple location files and combine into a unified format."""
-    all_locations = []
+    @staticmethod
+    def stream(file_path: str, batch_size: int = BATCH_SIZE, window: Optional[Tuple[int, int]] = None) -> Iterator[LocationTrack]:
+        """Detect the format and parse the file in one pass, yielding points in batches.
+
+        window is an optional (start, end) pair of epoch milliseconds outside
+        which points are discarded as they are read.
+        """
+        with archives.open_text(file_path) as f:
+            parser_class, elements = LocationParserFactory._detect(JSONStreamReader(f))
+            if parser_class is not NMEALocationParser:
+                yield from _batched(elements, parser_class.add_element, batch_size, window)
+                return
+        # NMEA logs are rescanned from the start as bytes, which is much faster than line by line
+        yield from NMEALocationParser.stream(file_path, batch_size, window)
+
+
+def expand_location_files(file_paths: List[str]) -> List[str]:
+    """Replace each zip archive among file_paths with the paths of its location history members.
+
+    Members are picked by name (see archives.zip_members) and kept only if
+    LocationParserFactory recognises their decompressed beginning. Other
+    files, compressed or not, are passed through unchanged.
+    """
+    expanded = []
+    for file_path in file_paths:
+        if not archives.is_zip(file_path):
+            expanded.append(file_path)
+            continue
+        members = []
+        for member in archives.zip_members(file_path):
+            try:
+                LocationParserFactory.get_parser(member)
+            except ValueError:
+                continue
+            except Exception as e:
+                print(f"Error reading {member}: {e}")
+                continue
+            members.append(member)
+        if not members:
+            print(f"No location history found in {file_path}.")
+        expanded.extend(members)
+    return expanded
+
+
+def parse_file(file_path: str, window: Optional[Tuple[int, int]] = None) -> Tuple[LocationTrack, Optional[str]]:
+    """Parse one location file into a sorted run.
+
+    Returns the run and an error message; on error the run holds the points
+    read before the failure. Runs in worker processes, so it never raises.
+    """
+    locations = LocationTrack()
+    error = None
+    try:
+        for batch in LocationParserFactory.stream(file_path, window=window):
+            locations.extend(batch)
+    except Exception as e:
+        error = f"Error parsing file {file_path}: {e}"
+    # Each file becomes one sorted run; exports are nearly ordered already
+    locations.sort()
+    return locations, error
+
+
+def _parse_files_parallel(file_paths: List[str], window: Optional[Tuple[int, int]], jobs: int) -> Iterator[Tuple[str, LocationTrack, Optional[str]]]:
+    """Parse files in a process pool, yielding (file_path, run, error) as each one finishes.
+
+    Runs come back as pickled column arrays, not per-point objects.
+    """
+    with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as pool:
+        futures = {pool.submit(parse_file, file_path, window): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                locations, error = future.result()
+            except Exception as e:
+                # A worker that dies (e.g. out of memory) only loses its own file
+                locations, error = LocationTrack(), f"Error parsing file {file_path}: {e}"
+            yield file_path, locations, error
+
+
+def parse_location_runs(file_paths: List[str], cache=None, window: Optional[Tuple[datetime, datetime]] = None,
+                        jobs: int = 1) -> Dict[str, LocationTrack]:
+    """Parse multiple location files into one sorted track per file.
+
+    Files that could not be parsed are reported and left out, including the
+    points read before the error. If a LocationCache is given, unchanged
+    files are loaded from it and freshly parsed files are stored in it. If a
+    (start, end) window is given, only points inside it are kept; they are
+    dropped while streaming, and such partial parses are not stored in the
+    cache. With jobs > 1, files that are not cached are parsed concurrently
+    in that many processes.
+
+    Files may be gzip, bzip2 or xz compressed, and zip archives such as a
+    Takeout export stand for their location history members (see
+    expand_location_files), which are parsed like separate files and
+    returned under paths of the form archive.zip::member. Nothing is
+    extracted to disk.
+    """
+    window_ms = (to_epoch_ms(window[0]), to_epoch_ms(window[1])) if window is not None else None
+    file_paths = expand_location_files(file_paths)
+    runs = {}
+    to_parse = []
 
     for file_path in file_paths:
-        try:
-            parser_class = LocationParserFactory.get_parser(file_path)
-            locations = parser_class.parse(file_path)
-            all_locations.extend(locations)
-        except Exception as e:
-            print(f"Error parsing file {file_path}: {e}")
+        cached = cache.load(file_path) if cache is not None else None
+        if cached is not None:
+            runs[file_path] = cached.between(*window) if window is not None else cached
+        else:
+            to_parse.append(file_path)
+
+    if jobs > 1 and len(to_parse) > 1:
+        results = _parse_files_parallel(to_parse, window_ms, jobs)
+    else:
+        results = ((file_path, *parse_file(file_path, window_ms)) for file_path in to_parse)
+
+    for file_path, locations, error in results:
+        if error:
+            print(error)
+            continue
+        if cache is not None and window is None:
+            try:
+                cache.store(file_path, locations)
+            except OSError as e:
+                print(f"Could not cache parsed locations for {file_path}: {e}")
+        runs[file_path] = locations
+    archives.close_archives()
+
+    # Keep the order the files were given so merged ties stay deterministic
+    return {file_path: runs[file_path] for file_path in file_paths if file_path in runs}
+
+
+def parse_location_files(file_paths: List[str], cache=None, window: Optional[Tuple[datetime, datetime]] = None,
+                         jobs: int = 1) -> LocationTrack:
+    """Parse multiple location files and combine into a unified format.
 
-    return sorted(all_locations, key=lambda x: x["timestamp"])
+    Takes the same arguments as parse_location_runs.
+    """
+    return merge_tracks(parse_location_runs(file_paths, cache, window, jobs).values())
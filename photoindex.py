@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from cache import default_cache_dir
+
+
+class PhotoRecord(NamedTuple):
+    """What Adocate last learned about a photo file."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    datetime_original: Optional[str]
+    has_gps: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Check whether the file is unchanged since this record was taken."""
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class PhotoIndex:
+    """SQLite index of photo metadata that lets re-runs skip unchanged files without opening them."""
+
+    def __init__(self, db_path: str = None):
+        if db_path is None:
+            os.makedirs(default_cache_dir(), exist_ok=True)
+            db_path = os.path.join(default_cache_dir(), "photos.sqlite")
+        self.db_path = db_path
+        # Lookups may come from pipeline reader threads while the caller stores results
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS photos (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                datetime_original TEXT,
+                has_gps INTEGER NOT NULL,
+                latitude REAL,
+                longitude REAL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def lookup(self, photo_path: str) -> Optional[PhotoRecord]:
+        """Return the stored record for photo_path, whether or not it is still current."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path, size, mtime_ns, datetime_original, has_gps, latitude, longitude FROM photos WHERE path = ?",
+                (os.path.abspath(photo_path),),
+            ).fetchone()
+        if row is None:
+            return None
+        return PhotoRecord(row[0], row[1], row[2], row[3], bool(row[4]), row[5], row[6])
+
+    def update(self, records: Iterable[PhotoRecord]):
+        """Insert or replace a batch of records in one transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(os.path.abspath(r.path), r.size, r.mtime_ns, r.datetime_original, int(r.has_gps), r.latitude, r.longitude) for r in records],
+            )
+
+    def close(self):
+        self.conn.close()
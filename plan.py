@@ -0,0 +1,223 @@
+import csv
+import os
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import parsers
+from cache import LocationCache
+from core import ADDED, SKIPPED, ERROR, INDEX_BATCH_SIZE, add_gps_to_photo, exif_timestamp, find_photos_recursively, prescan_photos
+from matching import make_index
+from photoindex import PhotoIndex, PhotoRecord
+from track import from_epoch_ms, merge_tracks, to_epoch_ms
+from xmp import read_sidecar_gps, write_sidecar_gps
+
+PLAN_FIELDS = ("path", "size", "mtime_ns", "photo_time", "latitude", "longitude", "delta_seconds", "source")
+
+
+class PlanEntry(NamedTuple):
+    """One photo to geotag, as decided by make_plan."""
+
+    path: str
+    size: int  # Size and mtime at planning time; apply_plan skips files changed since
+    mtime_ns: int
+    photo_time: datetime
+    latitude: float
+    longitude: float
+    delta_seconds: float  # Time between the photo and the nearest track point
+    source: str  # Location file holding the nearest track point
+
+
+def _nearest_sources(runs, track, photo_times):
+    """Return (delta_seconds, source) of the nearest track point in any run for each photo time.
+
+    track is the merge of runs. The nearest point is looked up in it once,
+    and its source is the first run, in the order given, holding a point at
+    that time; only runs whose time range covers that time are searched.
+    """
+    epochs = track.timestamps
+    spans = [(run.timestamps[0], run.timestamps[-1], run.timestamps, source) for source, run in runs.items() if run]
+    best = []
+    for photo_time in photo_times:
+        if not epochs:
+            best.append((None, None))
+            continue
+        i = bisect_right(epochs, to_epoch_ms(photo_time))
+        deltas = [(abs(photo_time - from_epoch_ms(epochs[j])), epochs[j]) for j in (i - 1, i) if 0 <= j < len(epochs)]
+        delta = min(deltas)[0]
+        nearest = [epoch for candidate, epoch in deltas if candidate == delta]
+        source = next(
+            source for first, last, timestamps, source in spans for epoch in nearest
+            if first <= epoch <= last and timestamps[bisect_left(timestamps, epoch)] == epoch
+        )
+        best.append((delta.total_seconds(), source))
+    return best
+
+
+def make_plan(photo_dir: str, location_files: List[str], overwrite: bool = False, use_cache: bool = True,
+              use_index: bool = True, window_tolerance: Optional[timedelta] = None, sidecar: bool = False,
+              interpolation: Optional[str] = None, max_gap: Optional[timedelta] = None,
+              jobs: int = 1) -> Tuple[List[PlanEntry], int, List[str]]:
+    """Match photos to locations without writing to them; return (entries, skipped, error_log).
+
+    Only the photos' header segments are read. The options mean the same as
+    for core.process_photos, and skipped counts photos that already have GPS
+    data.
+    """
+    photo_files = find_photos_recursively(photo_dir)
+    print(f"Found {len(photo_files)} photos.")
+
+    photo_index = PhotoIndex() if use_index else None
+    try:
+        tasks = [(photo_path, photo_index.lookup(photo_path) if photo_index else None, None) for photo_path in photo_files]
+        # Nothing is written here, so no EXIF blocks are kept
+        tasks, window = prescan_photos(tasks, overwrite, window_tolerance or timedelta(0), sidecar, exif_budget=0)
+        if photo_index:
+            photo_index.update(record for _, record, _ in tasks if record is not None)
+    finally:
+        if photo_index:
+            photo_index.close()
+
+    skipped_count, error_log, pending = 0, [], []
+    for photo_path, record, _ in tasks:
+        if record is None:
+            error_log.append(f"Error processing {photo_path}: file could not be read")
+        elif not overwrite and (record.has_gps or (sidecar and read_sidecar_gps(photo_path))):
+            skipped_count += 1
+        else:
+            photo_time = exif_timestamp(record)
+            if photo_time:
+                pending.append((record, photo_time))
+            else:
+                error_log.append(f"No timestamp found for: {photo_path}")
+
+    if window_tolerance is not None and window is None:
+        runs = {}
+    else:
+        cache = LocationCache() if use_cache else None
+        runs = parsers.parse_location_runs(location_files, cache, window if window_tolerance is not None else None, jobs)
+    track = merge_tracks(runs.values())
+    print(f"Loaded {len(track)} location points.")
+
+    photo_times = [photo_time for _, photo_time in pending]
+    matches = make_index(track, interpolation, max_gap).match_many(photo_times)
+    entries = []
+    for (record, photo_time), match, (delta, source) in zip(pending, matches, _nearest_sources(runs, track, photo_times)):
+        if match is None:
+            error_log.append(f"No location data found for: {record.path}")
+        else:
+            entries.append(PlanEntry(
+                os.path.abspath(record.path), record.size, record.mtime_ns, photo_time,
+                match["latitude"], match["longitude"], delta, source,
+            ))
+    return entries, skipped_count, error_log
+
+
+def write_plan(entries: Iterable[PlanEntry], plan_path: str):
+    """Write plan entries to a CSV file."""
+    with open(plan_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(PLAN_FIELDS)
+        for entry in entries:
+            writer.writerow((
+                entry.path, entry.size, entry.mtime_ns, entry.photo_time.isoformat(),
+                f"{entry.latitude:.7f}", f"{entry.longitude:.7f}", f"{entry.delta_seconds:.3f}", entry.source,
+            ))
+
+
+def read_plan(plan_path: str) -> List[PlanEntry]:
+    """Read the entries of a plan file written by write_plan."""
+    with open(plan_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        if tuple(next(reader, ())) != PLAN_FIELDS:
+            raise ValueError(f"{plan_path} is not an Adocate plan file.")
+        entries = []
+        for row in reader:
+            try:
+                path, size, mtime_ns, photo_time, latitude, longitude, delta_seconds, source = row
+                entries.append(PlanEntry(
+                    path, int(size), int(mtime_ns), datetime.fromisoformat(photo_time),
+                    float(latitude), float(longitude), float(delta_seconds), source,
+                ))
+            except ValueError as e:
+                raise ValueError(f"Invalid plan entry on line {reader.line_num} of {plan_path}: {e}")
+    return entries
+
+
+def apply_entry(entry: PlanEntry, sidecar: bool = False) -> Tuple[str, Optional[str], Optional[PhotoRecord]]:
+    """Write one planned location; return (status, message, record) like core.process_photo.
+
+    Photos modified since the plan was made are skipped, since their
+    metadata may no longer match what was planned.
+    """
+    try:
+        stat = os.stat(entry.path)
+        if stat.st_size != entry.size or stat.st_mtime_ns != entry.mtime_ns:
+            return SKIPPED, f"Changed since the plan was made: {entry.path}", None
+        if sidecar:
+            write_sidecar_gps(entry.path, entry.latitude, entry.longitude)
+            return ADDED, None, None
+        if not add_gps_to_photo(entry.path, entry.latitude, entry.longitude):
+            return ERROR, f"Failed to add GPS data to: {entry.path}", None
+
+        stat = os.stat(entry.path)
+        record = PhotoRecord(
+            entry.path, stat.st_size, stat.st_mtime_ns, entry.photo_time.strftime("%Y:%m:%d %H:%M:%S"),
+            True, entry.latitude, entry.longitude,
+        )
+        return ADDED, None, record
+    except Exception as e:
+        return ERROR, f"Error processing {entry.path}: {e}", None
+
+
+def _apply_chunk(entries, sidecar):
+    return [apply_entry(entry, sidecar) for entry in entries]
+
+
+def apply_plan(entries: List[PlanEntry], jobs: int = 1, sidecar: bool = False, use_index: bool = True,
+               progress_callback=None) -> Tuple[int, List[str], List[str]]:
+    """Write the locations of a plan; return (added, changed, error_log).
+
+    With jobs > 1 the photos are written by that many worker processes.
+    changed lists the photos skipped because they were modified after planning.
+    progress_callback(processed, discovered, total) is called as by
+    core.process_photos, with discovered and total both len(entries).
+    """
+    if jobs > 1 and len(entries) > 1:
+        chunk_size = max(1, min(64, len(entries) // (jobs * 4)))
+        chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = (result for chunk in pool.map(_apply_chunk, chunks, [sidecar] * len(chunks)) for result in chunk)
+    else:
+        pool = None
+        results = (apply_entry(entry, sidecar) for entry in entries)
+
+    photo_index = PhotoIndex() if use_index and not sidecar else None
+    added_count, changed, error_log = 0, [], []
+    pending_records = []
+    try:
+        for i, (status, message, record) in enumerate(results, start=1):
+            if status == ADDED:
+                added_count += 1
+            elif status == SKIPPED:
+                changed.append(message)
+            else:
+                error_log.append(message)
+
+            if photo_index and record:
+                pending_records.append(record)
+                if len(pending_records) >= INDEX_BATCH_SIZE:
+                    photo_index.update(pending_records)
+                    pending_records = []
+
+            if progress_callback:
+                progress_callback(i, len(entries), len(entries))
+    finally:
+        if pool:
+            pool.shutdown()
+        if photo_index:
+            photo_index.update(pending_records)
+            photo_index.close()
+
+    return added_count, changed, error_log
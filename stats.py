@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Stages of process_photos, in the order they first run
+STAGES = ("discover", "prescan", "load_locations", "probe", "match", "write", "index")
+COUNTERS = ("photos", "location_points", "bytes_read", "bytes_written")
+PERCENTILES = (50, 95, 99)
+
+# Metric name prefix of the Prometheus textfile
+METRIC_PREFIX = "adocate"
+
+Mark = Tuple[float, float]
+
+
+class RunStats:
+    """Per-stage wall and CPU time, counters and per-photo latencies of a process_photos run.
+
+    Stages are timed with start() and lap(), which measure wall time and the
+    calling thread's CPU time, so stages running in several threads at once
+    add up their own work. Counters are photos finished, location points
+    loaded, bytes of photo headers read while probing and bytes of photos and
+    sidecars written. A photo's latency runs from when it is picked up until
+    its result is ready, so in the pipeline it includes time spent queued.
+    All methods are thread-safe. Callers skip them entirely when no RunStats
+    is given, so an uninstrumented run pays nothing.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latencies = array("d")
+        self.worker_cpu = 0.0
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.elapsed = None
+        self.cpu_elapsed = None
+
+    @staticmethod
+    def start() -> Mark:
+        """Return a mark to pass to lap()."""
+        return time.perf_counter(), time.thread_time()
+
+    def lap(self, stage: str, mark: Mark, calls: int = 1) -> Mark:
+        """Add the time since mark to stage and return a new mark."""
+        now = self.start()
+        self.add_stage(stage, now[0] - mark[0], now[1] - mark[1], calls)
+        return now
+
+    def add_stage(self, stage: str, wall: float, cpu: float, calls: int = 1):
+        with self.lock:
+            self.wall[stage] += wall
+            self.cpu[stage] += cpu
+            self.calls[stage] += calls
+
+    def count(self, counter: str, amount: int = 1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def photo_done(self, picked_up: float):
+        """Record a finished photo picked up at perf_counter() time picked_up."""
+        latency = time.perf_counter() - picked_up
+        with self.lock:
+            self.counters["photos"] += 1
+            self.latencies.append(latency)
+
+    def timed_iter(self, iterable: Iterable, stage: str) -> Iterator:
+        """Yield from iterable, adding the time spent producing each item to stage."""
+        iterator = iter(iterable)
+        while True:
+            mark = self.start()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.lap(stage, mark, calls=0)
+                return
+            self.lap(stage, mark)
+            yield item
+
+    def snapshot(self) -> Dict:
+        """Return the collected numbers in a picklable form that merge() accepts."""
+        with self.lock:
+            return {
+                "wall": dict(self.wall), "cpu": dict(self.cpu), "calls": dict(self.calls),
+                "counters": dict(self.counters), "latencies": self.latencies.tobytes(),
+            }
+
+    def merge(self, snapshot: Dict):
+        """Add the numbers collected by a worker process's RunStats."""
+        with self.lock:
+            for stage in STAGES:
+                self.wall[stage] += snapshot["wall"][stage]
+                self.cpu[stage] += snapshot["cpu"][stage]
+                self.calls[stage] += snapshot["calls"][stage]
+                self.worker_cpu += snapshot["cpu"][stage]
+            for counter in COUNTERS:
+                self.counters[counter] += snapshot["counters"][counter]
+            self.latencies.frombytes(snapshot["latencies"])
+
+    def finish(self):
+        """Stop the run's overall clocks."""
+        self.elapsed = time.perf_counter() - self.started
+        self.cpu_elapsed = time.process_time() - self.cpu_started + self.worker_cpu
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the nearest-rank p-th percentile photo latency in seconds, or None without photos."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def as_dict(self) -> Dict:
+        """Return a JSON-serialisable summary of the run."""
+        if self.elapsed is None:
+            self.finish()
+        load_wall = self.wall["load_locations"]
+        return {
+            "wall_seconds": self.elapsed,
+            "cpu_seconds": self.cpu_elapsed,
+            "photos_per_second": self.counters["photos"] / self.elapsed if self.elapsed else 0.0,
+            "points_per_second": self.counters["location_points"] / load_wall if load_wall else 0.0,
+            "counters": dict(self.counters),
+            "stages": {
+                stage: {"wall_seconds": self.wall[stage], "cpu_seconds": self.cpu[stage], "calls": self.calls[stage]}
+                for stage in STAGES
+            },
+            "latency_seconds": {f"p{p}": self.percentile(p) for p in PERCENTILES},
+        }
+
+    def write_json(self, path: str):
+        """Write as_dict() to path as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+            f.write("\n")
+
+    def write_prometheus(self, path: str):
+        """Write the summary in the Prometheus text format, for node_exporter's textfile collector.
+
+        The file is written next to path and renamed over it, so the collector
+        never reads a partial file.
+        """
+        summary = self.as_dict()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{METRIC_PREFIX}_{name}{labels} {value:.9g}")
+
+        metric("run_wall_seconds", "gauge", "Wall time of the last run.", [("", summary["wall_seconds"])])
+        metric("run_cpu_seconds", "gauge", "CPU time of the last run, including worker processes.", [("", summary["cpu_seconds"])])
+        metric("photos_per_second", "gauge", "Photos finished per second of the last run.", [("", summary["photos_per_second"])])
+        metric("points_per_second", "gauge", "Location points loaded per second of loading.", [("", summary["points_per_second"])])
+        for counter, value in summary["counters"].items():
+            metric(counter, "gauge", f"{counter.replace('_', ' ').capitalize()} in the last run.", [("", value)])
+        for field, help_text in (("wall_seconds", "Wall time"), ("cpu_seconds", "CPU time"), ("calls", "Calls")):
+            metric(
+                f"stage_{field}", "gauge", f"{help_text} per stage of the last run.",
+                [(f'{{stage="{stage}"}}', values[field]) for stage, values in summary["stages"].items()],
+            )
+        metric(
+            "photo_latency_seconds", "gauge", "Per-photo latency percentiles of the last run.",
+            [(f'{{quantile="{p / 100}"}}', summary["latency_seconds"][f"p{p}"]) for p in PERCENTILES],
+        )
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+import core
+import jpegmeta
+from test_jpegmeta import JFIF, _app1, _exif, _jpeg
+
+# 2023-06-01T12:00:00Z, the DateTimeOriginal of the test photos
+PHOTO_MS = 1685620800000
+
+
+@pytest.fixture
+def records(tmp_path):
+    path = tmp_path / "Records.json"
+    locations = [{"timestampMs": str(PHOTO_MS + offset), "latitudeE7": 356000000, "longitudeE7": 1397000000}
+                 for offset in (-60000, 0, 60000)]
+    path.write_text(json.dumps({"locations": locations}))
+    return str(path)
+
+
+def _process(tmp_path, records, monkeypatch, **options):
+    written = []
+    add_gps_to_photo = core.add_gps_to_photo
+
+    def record_exif(photo_path, lat, lng, exif=None):
+        written.append(exif)
+        return add_gps_to_photo(photo_path, lat, lng, exif)
+
+    monkeypatch.setattr(core, "add_gps_to_photo", record_exif)
+    result = core.process_photos(str(tmp_path / "photos"), [records], use_cache=False, use_index=False,
+                                 journal_path=str(tmp_path / "journal"), **options)
+    return result, written
+
+
+@pytest.mark.parametrize("options", [{"io_threads": 0}, {"io_threads": 2}, {"io_threads": 0, "window_tolerance": timedelta(hours=1)},
+                                     {"io_threads": 2, "window_tolerance": timedelta(hours=1)}])
+def test_probed_exif_is_reused_for_the_write(tmp_path, records, monkeypatch, options):
+    (tmp_path / "photos").mkdir()
+    photo = _jpeg(tmp_path / "photos", JFIF, _app1(_exif()))
+    (added, skipped, errors), written = _process(tmp_path, records, monkeypatch, **options)
+
+    assert (added, skipped, errors) == (1, 0, [])
+    assert written[0] is not None and written[0].startswith(jpegmeta.EXIF_HEADER)
+    assert jpegmeta.probe_jpeg(photo).has_gps
+
+
+def test_photo_without_exif_block_is_tagged(tmp_path, records):
+    (tmp_path / "photos").mkdir()
+    photo = _jpeg(tmp_path / "photos", JFIF)
+    assert core.add_gps_to_photo(photo, 35.6, 139.7)
+    assert jpegmeta.probe_jpeg(photo).has_gps
+
+
+class _Index:
+    def match_many(self, photo_times):
+        return [(35.6, 139.7)] * len(photo_times)
+
+
+def test_cancelled_pipeline_yields_every_photo_it_read(monkeypatch):
+    cancel = threading.Event()
+    read, written = [], []
+
+    def read_photo(photo_path, overwrite, known, sidecar, stats, exif):
+        read.append(photo_path)
+        return None, None, photo_path, None, PHOTO_MS
+
+    def write_photo(photo_path, record, metadata, location, sidecar, stats):
+        time.sleep(0.01)
+        written.append(photo_path)
+        return core.ADDED, photo_path, record
+
+    monkeypatch.setattr(core, "read_photo", read_photo)
+    monkeypatch.setattr(core, "write_photo", write_photo)
+    tasks = ((f"photo{i}.jpg", None, None) for i in range(1000))
+    yielded = []
+    for _, message, _ in core._iter_results_pipelined(tasks, _Index(), io_threads=2, cancel=cancel):
+        yielded.append(message)
+        cancel.set()
+
+    assert len(yielded) < 1000
+    assert sorted(yielded) == sorted(written) == sorted(read)
@@ -0,0 +1,146 @@
+import os
+import stat
+import struct
+
+import pytest
+
+import jpegmeta
+
+JFIF = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+DQT = b"\xff\xdb" + struct.pack(">H", 67) + bytes(range(65))
+SOS = b"\xff\xda" + struct.pack(">H", 8) + b"\x01\x01\x00\x00\x3f\x00"
+# Entropy-coded data, including bytes that look like markers
+IMAGE_DATA = bytes(range(256)) * 64 + b"\xff\x00\xff\xe1\x00\x10Exif\x00\x00" + b"\xff\xd9"
+
+
+def _exif(datetime_original: str = "2023:06:01 12:00:00", gps: bool = False, pointer_type: int = jpegmeta.TYPE_LONG) -> bytes:
+    """Build a little-endian Exif payload with DateTimeOriginal and, optionally, a GPS IFD with coordinates."""
+    ifd0_entries = 2 if gps else 1
+    exif_ifd = 8 + 2 + 12 * ifd0_entries + 4
+    text = datetime_original.encode("ascii") + b"\x00"
+    string = exif_ifd + 2 + 12 + 4
+    gps_ifd = string + len(text)
+
+    tiff = b"II*\x00" + struct.pack("<I", 8)
+    tiff += struct.pack("<H", ifd0_entries) + struct.pack("<HHII", jpegmeta.TAG_EXIF_IFD, pointer_type, 1, exif_ifd)
+    if gps:
+        tiff += struct.pack("<HHII", jpegmeta.TAG_GPS_IFD, pointer_type, 1, gps_ifd)
+    tiff += struct.pack("<I", 0)
+    tiff += struct.pack("<H", 1) + struct.pack("<HHII", jpegmeta.TAG_DATETIME_ORIGINAL, jpegmeta.TYPE_ASCII, len(text), string)
+    tiff += struct.pack("<I", 0) + text
+    if gps:
+        tiff += struct.pack("<H", 2)
+        tiff += struct.pack("<HHII", jpegmeta.TAG_GPS_LATITUDE, 5, 3, 0) + struct.pack("<HHII", jpegmeta.TAG_GPS_LONGITUDE, 5, 3, 0)
+        tiff += struct.pack("<I", 0)
+    return jpegmeta.EXIF_HEADER + tiff
+
+
+def _app1(payload: bytes) -> bytes:
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _jpeg(tmp_path, *segments: bytes, name: str = "photo.jpg") -> str:
+    path = tmp_path / name
+    path.write_bytes(jpegmeta.SOI + b"".join(segments) + DQT + SOS + IMAGE_DATA)
+    return str(path)
+
+
+def _layout(path: str):
+    with open(path, "rb") as f:
+        segments, data_offset = jpegmeta.scan_segments(f)
+        exif_segments = [segment for segment in segments if jpegmeta._is_exif(f, segment)]
+        f.seek(data_offset)
+        return segments, exif_segments, f.read()
+
+
+def test_adding_exif_keeps_jfif_first_and_image_data(tmp_path):
+    path = _jpeg(tmp_path, JFIF)
+    jpegmeta.write_exif(path, _exif())
+
+    segments, exif_segments, data = _layout(path)
+    assert segments[0].marker == jpegmeta.APP0
+    assert exif_segments == [segments[1]]
+    assert data == SOS + IMAGE_DATA
+    assert jpegmeta.probe_jpeg(path).datetime_original == "2023:06:01 12:00:00"
+
+
+def test_existing_exif_is_replaced_not_duplicated(tmp_path):
+    path = _jpeg(tmp_path, JFIF, _app1(_exif("2001:01:01 00:00:00")))
+    jpegmeta.write_exif(path, _exif("2023:06:01 12:00:00", gps=True))
+
+    _, exif_segments, data = _layout(path)
+    assert len(exif_segments) == 1
+    assert data == SOS + IMAGE_DATA
+    summary = jpegmeta.probe_jpeg(path)
+    assert (summary.datetime_original, summary.has_gps) == ("2023:06:01 12:00:00", True)
+
+
+@pytest.mark.parametrize("copy", ["kernel", "userspace"])
+def test_rewrite_preserves_mode_and_leaves_no_temporary_file(tmp_path, monkeypatch, copy):
+    if copy == "userspace":
+        monkeypatch.delattr(os, "copy_file_range", raising=False)
+        monkeypatch.delattr(os, "sendfile", raising=False)
+    path = _jpeg(tmp_path, JFIF)
+    os.chmod(path, 0o640)
+    jpegmeta.write_exif(path, _exif())
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["photo.jpg"]
+    assert _layout(path)[2] == SOS + IMAGE_DATA
+
+
+def test_in_place_overwrites_a_large_enough_segment(tmp_path):
+    path = _jpeg(tmp_path, JFIF, _app1(_exif("2001:01:01 00:00:00", gps=True) + bytes(64)))
+    before = os.stat(path)
+    jpegmeta.write_exif(path, _exif("2023:06:01 12:00:00"), in_place=True)
+
+    after = os.stat(path)
+    assert (after.st_ino, after.st_size) == (before.st_ino, before.st_size)
+    summary = jpegmeta.probe_jpeg(path)
+    assert (summary.datetime_original, summary.has_gps) == ("2023:06:01 12:00:00", False)
+    assert _layout(path)[2] == SOS + IMAGE_DATA
+
+
+def test_in_place_rewrites_when_the_segment_is_too_small(tmp_path):
+    path = _jpeg(tmp_path, _app1(_exif("2001:01:01 00:00:00")))
+    jpegmeta.write_exif(path, _exif("2023:06:01 12:00:00", gps=True), in_place=True)
+
+    _, exif_segments, data = _layout(path)
+    assert len(exif_segments) == 1 and data == SOS + IMAGE_DATA
+    assert jpegmeta.probe_jpeg(path).has_gps
+
+
+def test_failed_write_leaves_the_original_untouched(tmp_path, monkeypatch):
+    path = _jpeg(tmp_path, JFIF, _app1(_exif("2001:01:01 00:00:00")))
+    with open(path, "rb") as f:
+        original = f.read()
+
+    def fail(src, dst, offset):
+        dst.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(jpegmeta, "_copy_range", fail)
+    with pytest.raises(OSError):
+        jpegmeta.write_exif(path, _exif("2023:06:01 12:00:00"))
+    with open(path, "rb") as f:
+        assert f.read() == original
+    assert os.listdir(tmp_path) == ["photo.jpg"]
+
+
+def test_invalid_exif_is_rejected_before_writing(tmp_path):
+    path = _jpeg(tmp_path, JFIF)
+    with pytest.raises(ValueError):
+        jpegmeta.write_exif(path, b"not exif")
+    with pytest.raises(ValueError):
+        jpegmeta.write_exif(path, jpegmeta.EXIF_HEADER + bytes(jpegmeta.MAX_SEGMENT_PAYLOAD))
+
+
+@pytest.mark.parametrize("pointer_type", [jpegmeta.TYPE_LONG, jpegmeta.TYPE_IFD])
+def test_sub_ifd_pointers_of_either_type_are_followed(pointer_type):
+    summary = jpegmeta.summarize_exif(_exif("2023:06:01 12:00:00", gps=True, pointer_type=pointer_type))
+    assert (summary.datetime_original, summary.has_gps) == ("2023:06:01 12:00:00", True)
+
+
+def test_other_pointer_types_are_ignored():
+    summary = jpegmeta.summarize_exif(_exif(gps=True, pointer_type=jpegmeta.TYPE_ASCII))
+    assert (summary.datetime_original, summary.has_gps) == (None, False)
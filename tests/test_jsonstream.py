@@ -0,0 +1,143 @@
+import hashlib
+import io
+import json
+import random
+
+import pytest
+
+import benchmark
+import jsonbackend
+import jsonstream
+import parsers
+
+CHUNK_SIZES = (1, 2, 3, 7, 16, 64, 4096, 1 << 20)
+# Characters that stress string scanning and batch boundaries
+STRING_CHARS = ["a", "{", "}", "[", "]", '"', "\\", "é", " ", "\U0001f600", " ", ",", ":"]
+NUMBERS = [0, -7, 123456789012345678, 2 ** 70, -(2 ** 64), 0.1, -0.0, 5e-324, 1e300, 1234.5678e-3]
+
+
+def _string(rng):
+    return "".join(rng.choice(STRING_CHARS) for _ in range(rng.randint(0, 6)))
+
+
+def _value(rng, depth=0):
+    r = rng.random()
+    if depth > 3 or r < 0.3:
+        return rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.random() * 10.0 ** rng.randint(-300, 300),
+                           rng.choice(NUMBERS), True, False, None, _string(rng)])
+    if r < 0.65:
+        return {_string(rng): _value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    return [_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def _document(rng):
+    document = {"before": _value(rng), "locations": [_value(rng) for _ in range(rng.randint(0, 8))]}
+    return json.dumps(document, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 1]))
+
+
+def _elements(text, chunk_size):
+    """Return the canonical JSON of each element iter_array yields, and the error that stopped it."""
+    elements = []
+    try:
+        for element in jsonstream.iter_array(io.StringIO(text), "locations", chunk_size):
+            elements.append(json.dumps(element, sort_keys=True))
+    except ValueError as e:
+        return elements, type(e).__name__
+    return elements, None
+
+
+@pytest.fixture(params=jsonbackend.BACKENDS)
+def backend(request, monkeypatch):
+    name = request.param
+    if name not in jsonbackend.available_backends():
+        pytest.skip(f"{name} is not installed")
+    previous = jsonbackend.backend()
+    # select_backend exports the name; monkeypatch restores the environment afterwards
+    monkeypatch.setenv(jsonbackend.BACKEND_VARIABLE, name)
+    jsonbackend.select_backend(name)
+    yield name
+    jsonbackend.select_backend(previous)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_iter_array_matches_json_loads(seed, backend):
+    rng = random.Random(seed)
+    for _ in range(100):
+        text = _document(rng)
+        expected = [json.dumps(element, sort_keys=True) for element in json.loads(text)["locations"]]
+        assert _elements(text, rng.choice(CHUNK_SIZES)) == (expected, None)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_backends_agree_on_corrupt_documents(seed, monkeypatch):
+    if "orjson" not in jsonbackend.available_backends():
+        pytest.skip("orjson is not installed")
+    previous = jsonbackend.backend()
+    monkeypatch.setenv(jsonbackend.BACKEND_VARIABLE, previous)
+    rng = random.Random(seed)
+    try:
+        for _ in range(100):
+            text = _document(rng)
+            k = rng.randrange(len(text))
+            text = text[:k] + rng.choice(["", "}", '"', ",", "x", "NaN"]) + text[k + 1:]
+            chunk_size = rng.choice(CHUNK_SIZES)
+            results = []
+            for name in jsonbackend.BACKENDS:
+                jsonbackend.select_backend(name)
+                results.append(_elements(text, chunk_size))
+            assert results[0] == results[1], text
+    finally:
+        jsonbackend.select_backend(previous)
+
+
+def _digest(track):
+    return hashlib.sha256(track.timestamps.tobytes() + track.latitudes.tobytes() + track.longitudes.tobytes()).hexdigest()
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("exports")
+    paths = {name: str(directory / f"{name}.json") for name in ("records", "semantic", "timeline")}
+    benchmark.generate_records(paths["records"], 5000)
+    benchmark.generate_semantic(paths["semantic"], 2000)
+    benchmark.generate_timeline(paths["timeline"], 5000)
+    return paths
+
+
+@pytest.mark.parametrize("export", ["records", "semantic", "timeline"])
+def test_parser_output_matches_stdlib_json(export, exports, backend):
+    path = exports[export]
+    track = parsers.LocationParserFactory.get_parser(path).parse(path)
+
+    jsonbackend.select_backend("json")
+    expected = parsers.LocationParserFactory.get_parser(path).parse(path)
+    jsonbackend.select_backend(backend)
+
+    assert len(track) > 0
+    assert _digest(track) == _digest(expected)
+
+
+class _CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.read_chars = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.read_chars += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize("corruption", ['"latitudeE7": x', '"latitudeE7": 1 2', '"latitudeE7": "a\nb"'])
+def test_corrupt_element_fails_without_reading_the_rest(corruption, backend):
+    element = '{"timestampMs": "1500000000000", "latitudeE7": 1, "longitudeE7": 2}'
+    elements = [element] * 20000
+    elements[1000] = element.replace('"latitudeE7": 1', corruption)
+    f = _CountingReader('{"locations": [' + ",".join(elements) + "]}")
+    chunk_size = 4096
+
+    with pytest.raises(ValueError):
+        for _ in jsonstream.iter_array(f, "locations", chunk_size):
+            pass
+    # The error is raised from the chunks around the bad element, not after buffering the rest of the file
+    assert f.read_chars < 1000 * len(element) + 4 * chunk_size
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import matching
+from core import find_closest_location
+from matching import LocationIndex
+from track import LocationTrack
+
+START = datetime(2023, 6, 1, tzinfo=timezone.utc)
+
+
+def _locations(rng, count):
+    """Time-sorted location dicts with many repeated timestamps and evenly spaced pairs."""
+    seconds = sorted(rng.choice([rng.randrange(0, 3600), rng.randrange(0, 3600, 10)]) for _ in range(count))
+    return [
+        {"latitude": rng.randrange(-900000000, 900000000) / 1e7,
+         "longitude": rng.randrange(-1800000000, 1800000000) / 1e7,
+         "timestamp": START + timedelta(seconds=second)}
+        for second in seconds
+    ]
+
+
+def _photo_times(rng, count):
+    # Whole and half seconds, so photos fall exactly between points 10 s apart as well as on them
+    return [START + timedelta(milliseconds=rng.randrange(-60000, 3660000, 500)) for _ in range(count)]
+
+
+@pytest.fixture(params=["numpy", "bisect"])
+def lookup(request, monkeypatch):
+    if request.param == "bisect":
+        monkeypatch.setattr(matching, "np", None)
+    elif matching.np is None:
+        pytest.skip("NumPy is not installed")
+    return request.param
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_nearest_matches_linear_scan(seed, lookup):
+    rng = random.Random(seed)
+    locations = _locations(rng, rng.choice([1, 2, 5, 50, 500]))
+    photo_times = _photo_times(rng, 200)
+    index = LocationIndex(LocationTrack.from_locations(locations))
+
+    expected = [find_closest_location(photo_time, locations) for photo_time in photo_times]
+    assert [index.nearest(photo_time) for photo_time in photo_times] == expected
+    assert index.nearest_many(photo_times) == expected
+
+
+def test_ties_prefer_the_earlier_point_and_the_first_duplicate(lookup):
+    locations = [
+        {"latitude": 1.0, "longitude": 1.0, "timestamp": START},
+        {"latitude": 2.0, "longitude": 2.0, "timestamp": START + timedelta(seconds=10)},
+        {"latitude": 3.0, "longitude": 3.0, "timestamp": START + timedelta(seconds=10)},
+        {"latitude": 4.0, "longitude": 4.0, "timestamp": START + timedelta(seconds=20)},
+    ]
+    index = LocationIndex(LocationTrack.from_locations(locations))
+    photo_times = [START + timedelta(seconds=5), START + timedelta(seconds=10), START + timedelta(seconds=15)]
+
+    expected = [find_closest_location(photo_time, locations) for photo_time in photo_times]
+    assert [location["latitude"] for location in expected] == [1.0, 2.0, 2.0]
+    assert index.nearest_many(photo_times) == expected
+    assert [index.nearest(photo_time) for photo_time in photo_times] == expected
+
+
+def test_empty_index_and_missing_photo_times(lookup):
+    assert LocationIndex(LocationTrack()).nearest(START) is None
+    index = LocationIndex(LocationTrack.from_locations(_locations(random.Random(0), 10)))
+    assert index.nearest_many([None, START, None])[0::2] == [None, None]
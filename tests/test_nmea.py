@@ -0,0 +1,78 @@
+import io
+import random
+from functools import reduce
+from operator import xor
+
+import pytest
+
+import nmea
+
+TALKERS = ["GP", "GN", "GL", "GA", "BD", "gp", "G1"]
+TIMES = ["235959", "235959.5", "000001.25", "120000.123456789012345678", "1200", "12a000", "120000.", ""]
+COORDINATES = ["4807.038", "01131.000", "4807", "4807.", "48.07.0", ".5", "9000.0001", "18000.0000001",
+               "1234567890123456789.5", "a12", ""]
+DATES = ["010623", "020623", "311299", "310299", "0106", "01062x", ""]
+LINE_ENDS = ["\r\n", "\n", "\r\n", ""]
+# Prepended to some sentences: line noise, a cut-off sentence and text between sentences
+NOISE = ["", "", "", "garbage", "$GPGGA,1200", "$GPGSV,3,1,11,10,63,137,17*7", "*"]
+
+
+def _sentence(body, rng):
+    checksum = reduce(xor, body.encode("ascii"), 0)
+    if rng.random() < 0.05:
+        checksum ^= 1 << rng.randrange(8)
+    digits = f"{checksum:02X}" if rng.random() < 0.8 else f"{checksum:02x}"
+    return f"{rng.choice(NOISE)}${body}*{digits}{rng.choice(LINE_ENDS)}"
+
+
+def _log(seed, count=300):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        time = rng.choice(TIMES) if rng.random() < 0.3 else f"{rng.randrange(24):02d}{rng.randrange(60):02d}{rng.randrange(60):02d}.00"
+        lat, lng = (rng.choice(COORDINATES) for _ in range(2))
+        ns, ew = rng.choice(["N", "S", "N", "X", ""]), rng.choice(["E", "W", "E", "EE", ""])
+        talker = rng.choice(TALKERS)
+        if rng.random() < 0.5:
+            fields = [f"{talker}GGA", time, lat, ns, lng, ew, rng.choice("01269x"), "08", "0.9", "545.4", "M", "46.9", "M", "", ""]
+        else:
+            date = rng.choice(DATES) if rng.random() < 0.3 else "010623"
+            fields = [f"{talker}RMC", time, rng.choice("AAV"), lat, ns, lng, ew, "022.4", "084.4", date, "003.1", "W"]
+        if rng.random() < 0.05:
+            fields = fields[:rng.randrange(1, len(fields))]
+        lines.append(_sentence(",".join(fields), rng))
+    return "".join(lines).encode("ascii")
+
+
+def _scan(data, chunk_size):
+    scanner = nmea.NMEAScanner()
+    points = []
+    for chunk in nmea.iter_stream_chunks(io.BytesIO(data), chunk_size):
+        points += scanner.feed(chunk).raw()
+    points += scanner.finish().raw()
+    return points, scanner.bad_checksums, scanner.malformed
+
+
+@pytest.mark.skipif(nmea.np is None, reason="NumPy is not installed")
+@pytest.mark.parametrize("chunk_size", [64, 1000, 1 << 20])
+@pytest.mark.parametrize("seed", range(10))
+def test_vectorised_scanner_matches_loop(seed, chunk_size, monkeypatch):
+    data = _log(seed)
+    vectorised = _scan(data, chunk_size)
+    monkeypatch.setattr(nmea, "np", None)
+    assert vectorised == _scan(data, chunk_size)
+
+
+def test_checksums_talkers_and_midnight():
+    body = [
+        "GNGGA,235959.00,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,",
+        "GPRMC,235959.00,A,4807.038,N,01131.000,E,022.4,084.4,010623,003.1,W",
+        "GLGGA,000001.00,4807.038,S,01131.000,W,1,08,0.9,545.4,M,46.9,M,,",
+    ]
+    data = "".join(f"${line}*{reduce(xor, line.encode(), 0):02X}\r\n" for line in body).encode()
+    data += b"$GPGGA,000002.00,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*00\r\n"
+    points, bad_checksums, malformed = _scan(data, 1 << 20)
+    midnight = 1685577600000  # 2023-06-01T00:00:00Z
+    assert [ts for ts, _, _ in points] == [midnight + 86399000, midnight + 86401000]
+    assert points[1][1:] == (-481173000, -115166667)
+    assert (bad_checksums, malformed) == (1, 0)
@@ -0,0 +1,22 @@
+import os
+from datetime import datetime
+
+import plan
+import xmp
+
+
+def test_apply_plan_reports_progress_like_process_photos(tmp_path):
+    entries = []
+    for name in ["a.jpg", "b.jpg"]:
+        path = tmp_path / name
+        path.write_bytes(b"\xff\xd8\xff\xd9")
+        stat = os.stat(path)
+        entries.append(plan.PlanEntry(str(path), stat.st_size, stat.st_mtime_ns, datetime(2023, 6, 1, 12), 35.5, 139.25,
+                                      0.0, "Records.json"))
+    calls = []
+
+    added, changed, error_log = plan.apply_plan(entries, sidecar=True,
+                                                progress_callback=lambda *args: calls.append(args))
+    assert (added, changed, error_log) == (2, [], [])
+    assert calls == [(1, 2, 2), (2, 2, 2)]
+    assert xmp.read_sidecar_gps(entries[1].path) is not None
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+import track
+from track import LocationTrack, merge_tracks
+
+
+def _run(rng, start, count):
+    ts = sorted(start + rng.randrange(0, 20) for _ in range(count))
+    return LocationTrack(ts, [rng.randrange(3) for _ in ts], [rng.randrange(2) for _ in ts])
+
+
+def _points(locations):
+    return list(locations.raw())
+
+
+@pytest.mark.skipif(track.np is None, reason="NumPy is not installed")
+@pytest.mark.parametrize("seed", range(20))
+def test_array_merge_matches_heap_merge(seed):
+    rng = random.Random(seed)
+    runs = [_run(rng, rng.randrange(0, 30), rng.randrange(0, 25)) for _ in range(rng.randrange(1, 6))]
+    runs = [run for run in runs if run]
+    if not runs:
+        return
+    assert _points(track._merge_arrays(runs)) == _points(track._merge_heap(runs))
+
+
+def test_merge_drops_duplicates_across_disjoint_runs_and_keeps_given_order_for_ties():
+    first = LocationTrack([1, 2, 3], [10, 20, 30], [1, 2, 3])
+    second = LocationTrack([3, 4], [30, 40], [3, 4])
+    third = LocationTrack([3, 3], [31, 30], [3, 3])
+    merged = merge_tracks([first, second, third])
+    assert _points(merged) == [(1, 10, 1), (2, 20, 2), (3, 30, 3), (3, 31, 3), (4, 40, 4)]
+
+
+def test_merge_returns_a_single_ordered_run_unchanged():
+    run = LocationTrack([1, 2, 3], [1, 2, 3], [1, 2, 3])
+    assert merge_tracks([LocationTrack(), run]) is run
+    assert len(merge_tracks([])) == 0
+
+
+def test_sort_is_stable():
+    locations = LocationTrack([3, 1, 2, 1], [0, 1, 2, 3], [4, 5, 6, 7])
+    locations.sort()
+    assert _points(locations) == [(1, 1, 5), (1, 3, 7), (2, 2, 6), (3, 0, 4)]
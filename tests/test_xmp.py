@@ -0,0 +1,49 @@
+import os
+import stat
+
+import pytest
+
+import xmp
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "IMG_1.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xd9")
+    return str(path)
+
+
+def test_sidecar_round_trip(photo):
+    xmp.write_sidecar_gps(photo, 35.5, -139.25)
+    latitude, longitude = xmp.read_sidecar_gps(photo)
+    assert latitude == pytest.approx(35.5) and longitude == pytest.approx(-139.25)
+
+
+def test_sibling_added_after_write_keeps_the_sidecar(photo):
+    xmp.write_sidecar_gps(photo, 35.5, 139.25)
+    sibling = os.path.splitext(photo)[0] + ".jpeg"
+    with open(sibling, "wb") as f:
+        f.write(b"\xff\xd8\xff\xd9")
+
+    assert xmp.read_sidecar_gps(photo) == pytest.approx((35.5, 139.25))
+    assert xmp.read_sidecar_gps(sibling) is None
+    xmp.write_sidecar_gps(sibling, 1.0, 2.0)
+    assert xmp.read_sidecar_gps(photo) == pytest.approx((35.5, 139.25))
+    assert sorted(name for name in os.listdir(os.path.dirname(photo)) if name.endswith(".xmp")) == [
+        "IMG_1.jpeg.xmp", "IMG_1.jpg.xmp"
+    ]
+
+
+def test_rewrite_keeps_other_metadata_and_mode(photo):
+    path = xmp.sidecar_path(photo)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+                '<rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/" dc:format="image/jpeg"/>'
+                "</rdf:RDF></x:xmpmeta>")
+    os.chmod(path, 0o640)
+
+    xmp.write_sidecar_gps(photo, -10.0, 20.0)
+    with open(path, encoding="utf-8") as f:
+        assert "image/jpeg" in f.read()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert [name for name in os.listdir(os.path.dirname(photo)) if name.endswith(".tmp")] == []
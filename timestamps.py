@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from track import to_epoch_ms
+
+# Distinct minutes remembered before the cache is reset
+MAX_CACHED = 1 << 16
+
+# Characters that may follow the seconds or the millisecond fraction in Google's timestamps
+OFFSET_STARTS = ("+", "-", "Z")
+
+# Milliseconds of each two-digit second and three-digit fraction; anything else is not a match
+SECOND_MS = {f"{second:02d}": second * 1000 for second in range(60)}
+FRACTION_MS = {f"{ms:03d}": ms for ms in range(1000)}
+# Looked up in place of a missing second or fraction, so that any sum including it is negative
+NO_MATCH = -60_000
+
+_minute_ms: Dict[str, int] = {}
+
+
+def _parse(text: str) -> int:
+    return to_epoch_ms(datetime.fromisoformat(text.replace("Z", "+00:00")))
+
+
+def _minute_base(key: str) -> int:
+    """Return epoch milliseconds at the start of the minute key, which is YYYY-MM-DDTHH:MM followed by an offset."""
+    if len(_minute_ms) >= MAX_CACHED:
+        _minute_ms.clear()
+    value = _minute_ms[key] = _parse(key[:16] + ":00" + key[16:])
+    return value
+
+
+def iso_to_epoch_ms(text: str) -> int:
+    """Convert an ISO 8601 timestamp to integer epoch milliseconds.
+
+    Timestamps without an offset are taken as UTC and fractions are truncated
+    to whole milliseconds, as track.to_epoch_ms does. Google's shape,
+    YYYY-MM-DDTHH:MM:SS with an optional three-digit fraction and a Z or
+    +hh:mm offset, is converted from the milliseconds at the start of its
+    minute, which are worked out once per minute and offset. Other shapes go
+    through datetime.fromisoformat; anything it rejects raises ValueError.
+    """
+    if text[16:17] == ":":
+        if text[19:20] == "." and text[23:24] in OFFSET_STARTS:
+            key, ms = text[:16] + text[23:], SECOND_MS.get(text[17:19], NO_MATCH) + FRACTION_MS.get(text[20:23], NO_MATCH)
+        elif text[19:20] in OFFSET_STARTS:
+            key, ms = text[:16] + text[19:], SECOND_MS.get(text[17:19], NO_MATCH)
+        else:
+            ms = -1
+        if ms >= 0:
+            base = _minute_ms.get(key)
+            if base is None:
+                base = _minute_base(key)
+            return base + ms
+    return _parse(text)
+
+
+def iso_to_epoch_ms_many(texts: Iterable[str]) -> List[int]:
+    """Convert a sequence of ISO 8601 timestamps like iso_to_epoch_ms, with less overhead per timestamp.
+
+    A ValueError leaves no partial result, so callers can retry one timestamp
+    at a time to find the bad ones.
+    """
+    seconds, fractions, minutes = SECOND_MS.get, FRACTION_MS.get, _minute_ms.get
+    results = []
+    append = results.append
+    for text in texts:
+        if text[19:20] == "." and text[16:17] == ":" and text[23:24] in OFFSET_STARTS:
+            ms = seconds(text[17:19], NO_MATCH) + fractions(text[20:23], NO_MATCH)
+            if ms >= 0:
+                key = text[:16] + text[23:]
+                base = minutes(key)
+                if base is None:
+                    base = _minute_base(key)
+                append(base + ms)
+                continue
+        append(iso_to_epoch_ms(text))
+    return results
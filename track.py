@@ -0,0 +1,246 @@
+import heapq
+import multiprocessing
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone, timedelta
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; is_sorted falls back to a Python loop
+    np = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MS = timedelta(milliseconds=1)
+
+
+def to_epoch_ms(timestamp: datetime) -> int:
+    """Convert a datetime to integer epoch milliseconds; naive values are taken as UTC."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return (timestamp - EPOCH) // ONE_MS
+
+
+def from_epoch_ms(epoch_ms: int) -> datetime:
+    """Convert integer epoch milliseconds to an aware UTC datetime."""
+    return EPOCH + timedelta(milliseconds=epoch_ms)
+
+
+def to_e7(degrees: float) -> int:
+    """Convert decimal degrees to the E7 fixed-point representation used by Google."""
+    return int(round(degrees * 1e7))
+
+
+class LocationTrack:
+    """Columnar store of location points.
+
+    Points live in three parallel contiguous arrays: int64 epoch milliseconds
+    and int32 E7 latitude/longitude. Iterating yields the same
+    {"latitude", "longitude", "timestamp"} dicts the parsers used to build, so
+    callers that only read points keep working unchanged.
+    """
+
+    def __init__(self, timestamps: Iterable[int] = (), latitudes: Iterable[int] = (), longitudes: Iterable[int] = ()):
+        self.timestamps = array("q", timestamps)
+        self.latitudes = array("i", latitudes)
+        self.longitudes = array("i", longitudes)
+
+    @classmethod
+    def from_locations(cls, locations: Iterable[Dict]) -> "LocationTrack":
+        """Build a track from an iterable of location dicts."""
+        track = cls()
+        for loc in locations:
+            track.add(loc["latitude"], loc["longitude"], loc["timestamp"])
+        return track
+
+    @classmethod
+    def from_shared(cls, shared: Tuple) -> "LocationTrack":
+        """Wrap the shared arrays produced by share() without copying them.
+
+        The resulting track is read-only: its columns are memoryviews.
+        """
+        track = cls.__new__(cls)
+        track.timestamps, track.latitudes, track.longitudes = (
+            memoryview(raw).cast("B").cast(typecode) for raw, typecode in zip(shared, "qii")
+        )
+        return track
+
+    @classmethod
+    def from_buffer(cls, buffer, count: int, offset: int = 0) -> "LocationTrack":
+        """Wrap count points laid out as the three columns back to back in buffer, without copying.
+
+        This is the layout LocationCache writes; the resulting track is read-only.
+        """
+        view = memoryview(buffer).cast("B")
+        track = cls.__new__(cls)
+        track.timestamps = view[offset:offset + count * 8].cast("q")
+        track.latitudes = view[offset + count * 8:offset + count * 12].cast("i")
+        track.longitudes = view[offset + count * 12:offset + count * 16].cast("i")
+        return track
+
+    def share(self) -> Tuple:
+        """Copy the columns into shared-memory arrays that can be handed to worker processes."""
+        shared = []
+        for column, typecode in ((self.timestamps, "q"), (self.latitudes, "i"), (self.longitudes, "i")):
+            raw = multiprocessing.RawArray(typecode, len(column))
+            memoryview(raw).cast("B")[:] = memoryview(column).cast("B")
+            shared.append(raw)
+        return tuple(shared)
+
+    def append(self, timestamp_ms: int, latitude_e7: int, longitude_e7: int):
+        """Append a point given in raw epoch-millisecond / E7 units."""
+        self.timestamps.append(timestamp_ms)
+        self.latitudes.append(latitude_e7)
+        self.longitudes.append(longitude_e7)
+
+    def add(self, latitude: float, longitude: float, timestamp: datetime):
+        """Append a point given in decimal degrees and a datetime."""
+        self.append(to_epoch_ms(timestamp), to_e7(latitude), to_e7(longitude))
+
+    def extend(self, other: "LocationTrack"):
+        """Append all points of another track."""
+        # frombytes copies whole columns at once and also accepts read-only memoryviews
+        self.timestamps.frombytes(memoryview(other.timestamps).cast("B"))
+        self.latitudes.frombytes(memoryview(other.latitudes).cast("B"))
+        self.longitudes.frombytes(memoryview(other.longitudes).cast("B"))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __bool__(self) -> bool:
+        return len(self.timestamps) > 0
+
+    def point(self, i: int) -> Dict:
+        """Return point i as a location dict."""
+        return {
+            "latitude": self.latitudes[i] / 1e7,
+            "longitude": self.longitudes[i] / 1e7,
+            "timestamp": from_epoch_ms(self.timestamps[i]),
+        }
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return LocationTrack(self.timestamps[key], self.latitudes[key], self.longitudes[key])
+        return self.point(key)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self.timestamps)):
+            yield self.point(i)
+
+    def raw(self) -> Iterator[Tuple[int, int, int]]:
+        """Iterate over (epoch_ms, latitude_e7, longitude_e7) tuples without building dicts."""
+        return zip(self.timestamps, self.latitudes, self.longitudes)
+
+    def is_sorted(self) -> bool:
+        """Check whether the points are in non-decreasing time order."""
+        ts = self.timestamps
+        if np is not None:
+            return bool(np.all(np.diff(np.frombuffer(ts, dtype=np.int64)) >= 0))
+        return all(ts[i] <= ts[i + 1] for i in range(len(ts) - 1))
+
+    def sort(self):
+        """Sort the points by timestamp in place; stable for equal timestamps."""
+        if self.is_sorted():
+            return
+        ts = self.timestamps
+        if np is not None:
+            columns = _columns([self])
+            order = np.argsort(columns[0], kind="stable")
+            ordered = _from_columns(*(column[order] for column in columns))
+            self.timestamps, self.latitudes, self.longitudes = ordered.timestamps, ordered.latitudes, ordered.longitudes
+            return
+        # Timsort is adaptive, so nearly ordered exports cost little more than a scan
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        self.timestamps = array("q", [ts[i] for i in order])
+        self.latitudes = array("i", [self.latitudes[i] for i in order])
+        self.longitudes = array("i", [self.longitudes[i] for i in order])
+
+    def select(self, start_ms: int, end_ms: int) -> "LocationTrack":
+        """Return the points with start_ms <= timestamp <= end_ms, keeping their order; the track need not be sorted."""
+        ts = self.timestamps
+        if not ts or (min(ts) >= start_ms and max(ts) <= end_ms):
+            return self
+        keep = [i for i, t in enumerate(ts) if start_ms <= t <= end_ms]
+        return LocationTrack(
+            [ts[i] for i in keep],
+            [self.latitudes[i] for i in keep],
+            [self.longitudes[i] for i in keep],
+        )
+
+    def between(self, start: datetime = None, end: datetime = None) -> "LocationTrack":
+        """Return the points with start <= timestamp <= end from a sorted track."""
+        lo = bisect_left(self.timestamps, to_epoch_ms(start)) if start is not None else 0
+        hi = bisect_right(self.timestamps, to_epoch_ms(end)) if end is not None else len(self)
+        return self[lo:hi]
+
+
+def _columns(tracks: List[LocationTrack]) -> Tuple:
+    """Return the tracks' timestamps, latitudes and longitudes, each concatenated into one NumPy array."""
+    return tuple(
+        np.concatenate([np.frombuffer(getattr(track, name), dtype=dtype) for track in tracks])
+        for name, dtype in (("timestamps", np.int64), ("latitudes", np.int32), ("longitudes", np.int32))
+    )
+
+
+def _from_columns(timestamps, latitudes, longitudes) -> LocationTrack:
+    """Build a track from three NumPy columns, copying each once."""
+    track = LocationTrack()
+    for column, values in ((track.timestamps, timestamps), (track.latitudes, latitudes), (track.longitudes, longitudes)):
+        column.frombytes(memoryview(np.ascontiguousarray(values)).cast("B"))
+    return track
+
+
+def _merge_arrays(runs: List[LocationTrack]) -> LocationTrack:
+    """Concatenate the runs and stable-sort them by time, dropping exact duplicate points."""
+    ts, lat, lng = _columns(runs)
+    order = np.argsort(ts, kind="stable")
+    sorted_ts = ts[order]
+    repeated = sorted_ts[1:] == sorted_ts[:-1]
+    if repeated.any():
+        # Only points sharing a timestamp can be duplicates; order those by position too, so that
+        # copies are adjacent, keeping the first copy in the order the runs were given
+        shared = np.zeros(len(ts), dtype=bool)
+        shared[1:] |= repeated
+        shared[:-1] |= repeated
+        candidates = order[shared]
+        by_point = candidates[np.lexsort((candidates, lng[candidates], lat[candidates], ts[candidates]))]
+        same = (ts[by_point[1:]] == ts[by_point[:-1]]) & (lat[by_point[1:]] == lat[by_point[:-1]])
+        same &= lng[by_point[1:]] == lng[by_point[:-1]]
+        duplicate = np.zeros(len(ts), dtype=bool)
+        duplicate[by_point[1:][same]] = True
+        order = order[~duplicate[order]]
+    if len(order) == len(ts) and bool(np.all(order[1:] > order[:-1])):
+        # Already in order, like monthly files given oldest first; a lone cached run stays a zero-copy view
+        return runs[0] if len(runs) == 1 else _from_columns(ts, lat, lng)
+    return _from_columns(ts[order], lat[order], lng[order])
+
+
+def _merge_heap(runs: List[LocationTrack]) -> LocationTrack:
+    """Heap-merge sorted runs, dropping exact duplicate points."""
+    merged = LocationTrack()
+    current_ts, seen = None, set()
+    for point in heapq.merge(*(run.raw() for run in runs), key=itemgetter(0)):
+        if point[0] != current_ts:
+            current_ts, seen = point[0], set()
+        if point in seen:
+            continue
+        seen.add(point)
+        merged.append(*point)
+    return merged
+
+
+def merge_tracks(tracks: Iterable[LocationTrack]) -> LocationTrack:
+    """Merge time-sorted tracks into one time-sorted track.
+
+    Exact duplicate points (same time and position) are kept once, wherever
+    they come from. Ties between points keep the order in which the runs
+    were given. With NumPy the runs are concatenated and stable-sorted;
+    without it they go through a streaming heap merge.
+    """
+    runs = [track for track in tracks if track]
+    if not runs:
+        return LocationTrack()
+    if np is not None:
+        return _merge_arrays(runs)
+    return _merge_heap(runs)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Optional, Tuple
+
+NS_X = "adobe:ns:meta/"
+NS_RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+NS_EXIF = "http://ns.adobe.com/exif/1.0/"
+
+for _prefix, _uri in (("x", NS_X), ("rdf", NS_RDF), ("exif", NS_EXIF)):
+    ET.register_namespace(_prefix, _uri)
+
+GPS_LATITUDE = f"{{{NS_EXIF}}}GPSLatitude"
+GPS_LONGITUDE = f"{{{NS_EXIF}}}GPSLongitude"
+GPS_VERSION_ID = f"{{{NS_EXIF}}}GPSVersionID"
+DESCRIPTION = f"{{{NS_RDF}}}Description"
+
+
+def sidecar_path(photo_path: str) -> str:
+    """Return the XMP sidecar path for a photo (IMG_0001.jpg -> IMG_0001.jpg.xmp).
+
+    The name keeps the photo's extension, so photos that differ only in
+    theirs (IMG_0001.jpg and IMG_0001.jpeg) never share a sidecar, and it
+    does not depend on which other files exist.
+    """
+    return photo_path + ".xmp"
+
+
+def format_coordinate(value: float, positive: str, negative: str) -> str:
+    """Format decimal degrees as an XMP GPSCoordinate ("DDD,MM.mmmmmmk")."""
+    ref = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    return f"{degrees},{(value - degrees) * 60:.6f}{ref}"
+
+
+def parse_coordinate(text: str) -> float:
+    """Parse an XMP GPSCoordinate in either "DDD,MM.mmk" or "DDD,MM,SSk" form."""
+    text = text.strip()
+    ref, parts = text[-1].upper(), text[:-1].split(",")
+    value = float(parts[0]) + float(parts[1]) / 60
+    if len(parts) > 2:
+        value += float(parts[2]) / 3600
+    return -value if ref in ("S", "W") else value
+
+
+def _gps_value(description: ET.Element, name: str) -> Optional[str]:
+    value = description.get(name)
+    if value is None:
+        child = description.find(name)
+        if child is not None:
+            value = child.text
+    return value
+
+
+def read_sidecar_gps(photo_path: str) -> Optional[Tuple[float, float]]:
+    """Return (latitude, longitude) from the photo's XMP sidecar, or None if it has none."""
+    path = sidecar_path(photo_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        root = ET.parse(path).getroot()
+        for description in root.iter(DESCRIPTION):
+            latitude = _gps_value(description, GPS_LATITUDE)
+            longitude = _gps_value(description, GPS_LONGITUDE)
+            if latitude and longitude:
+                return parse_coordinate(latitude), parse_coordinate(longitude)
+    except (ET.ParseError, ValueError, IndexError) as e:
+        print(f"Error reading XMP sidecar {path}: {e}")
+    return None
+
+
+def write_sidecar_gps(photo_path: str, lat: float, lng: float):
+    """Record GPS coordinates in the photo's XMP sidecar, creating it if needed.
+
+    Other metadata in an existing sidecar is preserved; the photo itself is
+    never modified.
+    """
+    path = sidecar_path(photo_path)
+    root = None
+    if os.path.exists(path):
+        try:
+            root = ET.parse(path).getroot()
+        except ET.ParseError as e:
+            print(f"Replacing unreadable XMP sidecar {path}: {e}")
+
+    if root is None:
+        root = ET.Element(f"{{{NS_X}}}xmpmeta", {f"{{{NS_X}}}xmptk": "Adocate"})
+    rdf = root if root.tag == f"{{{NS_RDF}}}RDF" else root.find(f"{{{NS_RDF}}}RDF")
+    if rdf is None:
+        rdf = ET.SubElement(root, f"{{{NS_RDF}}}RDF")
+    description = rdf.find(DESCRIPTION)
+    if description is None:
+        description = ET.SubElement(rdf, DESCRIPTION, {f"{{{NS_RDF}}}about": ""})
+
+    for name in (GPS_LATITUDE, GPS_LONGITUDE, GPS_VERSION_ID):
+        for child in description.findall(name):
+            description.remove(child)
+    description.set(GPS_VERSION_ID, "2.2.0.0")
+    description.set(GPS_LATITUDE, format_coordinate(lat, "N", "S"))
+    description.set(GPS_LONGITUDE, format_coordinate(lng, "E", "W"))
+
+    # A unique temporary file, since several writer threads may be saving sidecars at once
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            ET.ElementTree(root).write(f, encoding="utf-8", xml_declaration=True)
+        # mkstemp creates the file private to the user; give it the old sidecar's or the photo's permissions
+        shutil.copymode(path if os.path.exists(path) else photo_path, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)